@@ -1,3 +1,4 @@
+import functools
 import logging
 from itertools import chain
 
@@ -7,7 +8,10 @@ from mautrix.util.async_db import UpgradeTable
 from mautrix.util.config import BaseProxyConfig
 
 from .bugzilla import BugzillaHandler
-from .clients.fasjson import FasjsonClient
+from .clients.cache import ResponseCache, TTLCache
+from .clients.fasjson import CachedUser, FasjsonClient
+from .clients.kerberos import CredentialsRenewer
+from .clients.upstream import Upstreams
 from .config import Config
 from .constants import NL
 from .cookie import CookieHandler
@@ -16,7 +20,11 @@ from .distgit import DistGitHandler
 from .fas import FasHandler
 from .forge import ForgeHandler
 from .infra import InfraHandler
+from .matrixids import MatrixIdIndex
 from .pagureio import PagureIOHandler
+from .rooms import DISPLAYNAME_TTL, MAX_DISPLAYNAMES, RoomMembers, RoomsHandler
+from .snapshots import CacheSnapshots
+from .usersnapshot import UserSnapshot
 
 log = logging.getLogger(__name__)
 
@@ -29,7 +37,62 @@ class Fedora(Plugin):
     async def start(self) -> None:
         assert self.config  # noqa: S101 # This is a valid use of assert
         self.config.load_and_update()
-        self.fasjsonclient = FasjsonClient(self.config["fasjson_url"])
+        self.cache = ResponseCache(
+            max_entries=self.config["cache.max_entries"],
+            max_bytes=self.config["cache.max_bytes"],
+            ttls=self.config["cache.ttl"],
+            max_stale=self.config["cache.max_stale"],
+        )
+        self.upstreams = Upstreams(self.config["upstreams"], cache=self.cache)
+        self.user_cache = TTLCache(
+            max_entries=self.config["user_cache.max_entries"], ttl=self.config["user_cache.ttl"]
+        )
+        self.missing_cache = TTLCache(
+            max_entries=self.config["missing_cache.max_entries"],
+            ttl=self.config["missing_cache.ttl"],
+        )
+        self.snapshots = CacheSnapshots(
+            self.database, interval=self.config["cache_snapshot_interval"]
+        )
+        self.snapshots.add("responses", self.cache.dump, self.cache.load)
+        self.snapshots.add(
+            "users",
+            functools.partial(self.user_cache.dump, encode=CachedUser.to_json),
+            functools.partial(self.user_cache.load, decode=CachedUser.from_json),
+        )
+        self.snapshots.add("missing", self.missing_cache.dump, self.missing_cache.load)
+        await self.snapshots.load()
+        self.snapshots.start()
+        self.matrix_ids = MatrixIdIndex(
+            self.database, refresh_interval=self.config["matrix_id_refresh"]
+        )
+        self.user_snapshot = UserSnapshot(
+            self.database,
+            interval=self.config["fas_snapshot.interval"],
+            max_age=self.config["fas_snapshot.max_age"],
+            page_size=self.config["fas_snapshot.page_size"],
+        )
+        self.fasjsonclient = FasjsonClient(
+            self.config["fasjson_url"],
+            upstream=self.upstreams["fasjson"],
+            users=self.user_cache,
+            matrix_ids=self.matrix_ids,
+            missing=self.missing_cache,
+            snapshot=self.user_snapshot,
+        )
+        await self.user_snapshot.start(self.fasjsonclient)
+        kerberos = self.config["fasjson_kerberos"]
+        self.fasjsonclient.auth.min_lifetime = kerberos["min_lifetime"]
+        self.credentials_renewer = CredentialsRenewer(
+            self.fasjsonclient.auth,
+            keytab=kerberos["keytab"],
+            ccache=kerberos["ccache"],
+            interval=kerberos["renew_interval"],
+        )
+        self.credentials_renewer.start()
+        self.room_members = RoomMembers()
+        self.displaynames = TTLCache(max_entries=MAX_DISPLAYNAMES, ttl=DISPLAYNAME_TTL)
+        self.register_handler_class(RoomsHandler(self))
         self.register_handler_class(PagureIOHandler(self))
         self.register_handler_class(ForgeHandler(self))
         self.register_handler_class(DistGitHandler(self))
@@ -39,7 +102,10 @@ class Fedora(Plugin):
         self.register_handler_class(CookieHandler(self))
 
     async def stop(self) -> None:
-        pass
+        await self.credentials_renewer.stop()
+        await self.snapshots.stop()
+        await self.user_snapshot.stop()
+        await self.upstreams.aclose()
 
     @classmethod
     def get_config_class(cls) -> type[BaseProxyConfig]:
@@ -0,0 +1,85 @@
+import asyncio
+import logging
+
+import httpx
+
+from ..exceptions import InfoGatherError
+from .cache import CacheEntry
+from .deadline import remaining
+from .upstream import Upstream
+
+log = logging.getLogger(__name__)
+
+
+def request_key(url, params=None, headers=None, **kwargs):
+    """Identify a GET request by what changes its response"""
+    return str(httpx.URL(url, params=params)), tuple(sorted((headers or {}).items()))
+
+
+class BaseClient:
+    # The name of the upstream to create when the client is not given a shared one
+    name = "default"
+
+    def __init__(self, baseurl, upstream: Upstream | None = None):
+        self.baseurl = baseurl
+        self.upstream = upstream or Upstream(self.name)
+
+    async def _get(self, endpoint, **kwargs) -> httpx.Response:
+        """
+        Send a GET request to the upstream
+
+        The `cache` keyword argument is the class of the endpoint, which sets how long its
+        successful responses are cached for, and how long they can be served stale after that.
+        The request is given up on with InfoGatherError if the deadline of the current command
+        passes before the upstream answers.
+        """
+        endpoint_class = kwargs.pop("cache", None)
+        if self.upstream.cache is None or not self.upstream.cache.ttl(endpoint_class):
+            endpoint_class = None
+        url = self.baseurl + endpoint
+        key = request_key(url, **kwargs)
+        entry = self.upstream.cache.lookup(key) if endpoint_class else None
+
+        def fetch():
+            return self._fetch(url, key, endpoint_class, entry, **kwargs)
+
+        if entry is not None and not entry.expired:
+            return entry.response
+        if entry is not None and entry.stale:
+            # Answer right away, the next callers will get the refreshed response
+            self.upstream.run_in_background(self.upstream.singleflight.do(key, fetch))
+            return entry.response
+        try:
+            # The request goes on for the other callers, and to fill the cache
+            return await asyncio.wait_for(self.upstream.singleflight.do(key, fetch), remaining())
+        except asyncio.TimeoutError as e:
+            raise InfoGatherError(
+                f"Sorry, {self.upstream.name} took too long to answer, please try again later"
+            ) from e
+
+    async def _fetch(
+        self, url, key, endpoint_class, entry: CacheEntry | None, **kwargs
+    ) -> httpx.Response:
+        if entry is not None:
+            # Only download the response again if it has changed
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **entry.validators}
+
+        def send():
+            return self.upstream.http.get(url, **kwargs)
+
+        async def attempt():
+            # GET requests are safe to hedge and to retry
+            return await self.upstream.breaker.call(
+                lambda: self.upstream.hedger.call(send, self.upstream.limiter.limit)
+            )
+
+        response = await self.upstream.retry.call(attempt)
+        if entry is not None and response.status_code == 304:
+            response = entry.response
+        elif entry is not None and response.status_code != 200:
+            # Keep the cached response, it may still be served stale
+            log.warning(f"Could not refresh {response.url}: {response.status_code}")
+        if endpoint_class and response.status_code == 200:
+            cache = self.upstream.cache
+            cache.set(key, response, cache.ttl(endpoint_class), cache.max_stale(endpoint_class))
+        return response
@@ -1,17 +1,13 @@
-import httpx
-
 from ..exceptions import InfoGatherError
+from .base import BaseClient
 
 
-class BodhiClient:
-    def __init__(self, baseurl):
-        self.baseurl = baseurl
+class BodhiClient(BaseClient):
+    name = "bodhi"
 
     async def _get(self, endpoint, **kwargs):
         kwargs.setdefault("headers", {})["Content-Type"] = "application/json"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint, **kwargs)
-        return response
+        return await super()._get(endpoint, **kwargs)
 
     def _check_errors(self, response):
         if response.status_code == 404:
@@ -28,6 +24,7 @@ class BodhiClient:
         response = await self._get(
             "/releases/",
             params={"state": "current"},
+            cache="release",
         )
         self._check_errors(response)
         fedora_releases = [r for r in response.json()["releases"] if r["id_prefix"] == "FEDORA"]
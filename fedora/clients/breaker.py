@@ -0,0 +1,93 @@
+import logging
+from collections.abc import Awaitable, Callable
+from time import monotonic
+
+import httpx
+
+from ..exceptions import InfoGatherError
+
+log = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Stop sending requests to an upstream that keeps failing
+
+    After `threshold` consecutive failures (connection errors, timeouts or 5xx responses) the
+    circuit opens and requests fail right away. Once `recovery_timeout` seconds have passed, a
+    single request is let through to probe the upstream: the circuit closes if it succeeds and
+    opens again if it fails. A threshold of 0 disables the breaker.
+    """
+
+    def __init__(self, name, threshold=5, recovery_timeout=30) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # Counters, to see how the upstream has been behaving
+        self.trips = 0
+        self.rejected = 0
+        self._probing = False
+
+    def _set_state(self, state):
+        log.log(
+            logging.WARNING if state == OPEN else logging.INFO,
+            f"Circuit breaker for {self.name} is now {state} (consecutive failures: "
+            f"{self.failures}, trips: {self.trips}, rejected requests: {self.rejected})",
+        )
+        self.state = state
+
+    def check(self):
+        """Raise InfoGatherError if no request should be sent to the upstream right now"""
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN:
+            if monotonic() - self.opened_at < self.recovery_timeout:
+                self._reject()
+            self._set_state(HALF_OPEN)
+        if self._probing:
+            self._reject()
+        self._probing = True
+
+    def _reject(self):
+        self.rejected += 1
+        raise InfoGatherError(
+            f"Sorry, {self.name} is not responding at the moment, please try again later"
+        )
+
+    def record_success(self):
+        self._probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._probing = False
+        self.failures += 1
+        if self.threshold and (self.state == HALF_OPEN or self.failures >= self.threshold):
+            self.opened_at = monotonic()
+            self.trips += 1
+            self._set_state(OPEN)
+
+    async def call(self, func: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        self.check()
+        try:
+            response = await func()
+        except httpx.TransportError:
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancelled: let the next request probe the upstream instead
+            self._probing = False
+            raise
+        if response.status_code >= 500:
+            self.record_failure()
+        else:
+            self.record_success()
+        return response
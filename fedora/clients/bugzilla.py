@@ -1,16 +1,12 @@
-import httpx
-
 from ..exceptions import InfoGatherError
+from .base import BaseClient
 
 
-class BugzillaClient:
-    def __init__(self, baseurl):
-        self.baseurl = f"{baseurl}/rest/"
+class BugzillaClient(BaseClient):
+    name = "bugzilla"
 
-    async def _get(self, endpoint, **kwargs):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint, **kwargs)
-        return response
+    def __init__(self, baseurl, upstream=None):
+        super().__init__(f"{baseurl}/rest/", upstream=upstream)
 
     def _check_errors(self, response):
         if response.status_code == 404:
@@ -21,6 +17,6 @@ class BugzillaClient:
             )
 
     async def get_bug(self, bug_id):
-        response = await self._get("/".join(["bug", bug_id]))
+        response = await self._get("/".join(["bug", bug_id]), cache="bug")
         self._check_errors(response)
         return response.json()
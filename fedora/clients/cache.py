@@ -0,0 +1,281 @@
+import base64
+import logging
+from collections import OrderedDict
+from collections.abc import Hashable
+from dataclasses import dataclass
+from time import monotonic, time
+from typing import Any
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Headers that describe how the content was sent, not the content that is kept
+_TRANSFER_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+# How long to keep the responses of each class of endpoint, in seconds. Unknown classes are not
+# cached. Overridden by the "cache.ttl" section of the config.
+DEFAULT_TTLS = {
+    "user": 300,
+    "user_search": 300,
+    "group": 3600,
+    "group_membership": 600,
+    "project": 600,
+    "issue": 60,
+    "pull_request": 60,
+    "bug": 60,
+    "release": 3600,
+    "outages": 60,
+}
+
+# How long after their expiry the responses of each class of endpoint can still be served while
+# they are refreshed in the background, in seconds. Overridden by the "cache.max_stale" section
+# of the config.
+DEFAULT_MAX_STALE = {
+    "release": 86400,
+    "outages": 600,
+}
+
+# The largest response saved in a snapshot of the cache, and the most content saved in all, in
+# bytes. The snapshot keeps the most recently used responses, the others are fetched again.
+SNAPSHOT_MAX_ENTRY_SIZE = 64 * 1024
+SNAPSHOT_MAX_SIZE = 4 * 1024 * 1024
+
+
+@dataclass
+class CacheEntry:
+    response: httpx.Response
+    size: int
+    expires: float
+    stale_until: float
+
+    @property
+    def expired(self) -> bool:
+        return monotonic() >= self.expires
+
+    @property
+    def stale(self) -> bool:
+        """Whether the entry has expired but can still be served while it is refreshed"""
+        return self.expires <= monotonic() < self.stale_until
+
+    @property
+    def dropped(self) -> bool:
+        """Whether the entry can't be used anymore, not even to revalidate it"""
+        return self.expired and not self.stale and not self.validators
+
+    @property
+    def validators(self) -> dict[str, str]:
+        """The headers to ask the upstream whether the response has changed"""
+        headers = {}
+        if etag := self.response.headers.get("ETag"):
+            headers["If-None-Match"] = etag
+        if last_modified := self.response.headers.get("Last-Modified"):
+            headers["If-Modified-Since"] = last_modified
+        return headers
+
+
+class ResponseCache:
+    """
+    An in-memory cache of upstream responses
+
+    Entries expire after the TTL of their endpoint class, and the least recently used ones are
+    evicted when the cache holds more than `max_entries` responses or `max_bytes` of content.
+    Expired entries are kept if they can be revalidated with the upstream, or served stale for
+    the `max_stale` of their endpoint class. Any object with the same `ttl`, `max_stale`,
+    `lookup`, `get` and `set` methods can be given to the upstreams instead.
+    """
+
+    def __init__(
+        self, max_entries=2048, max_bytes=32 * 1024 * 1024, ttls=None, max_stale=None
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.stale_limits = {**DEFAULT_MAX_STALE, **(max_stale or {})}
+        self.size = 0
+        self._entries: OrderedDict[tuple, CacheEntry] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def ttl(self, endpoint_class):
+        return self.ttls.get(endpoint_class, 0)
+
+    def max_stale(self, endpoint_class):
+        return self.stale_limits.get(endpoint_class, 0)
+
+    def lookup(self, key) -> CacheEntry | None:
+        """Return the entry for the key, even expired if it can be revalidated"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.dropped:
+            self._remove(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key) -> httpx.Response | None:
+        """Return the response for the key if it has not expired"""
+        entry = self.lookup(key)
+        if entry is None or entry.expired:
+            return None
+        return entry.response
+
+    def set(self, key, response: httpx.Response, ttl, max_stale=0):
+        size = len(response.content)
+        if size > self.max_bytes:
+            log.debug(f"Not caching {response.url}: {size} bytes is more than the cache size")
+            return
+        expires = monotonic() + ttl
+        self._add(key, CacheEntry(response, size, expires, expires + max_stale))
+
+    def _add(self, key, entry: CacheEntry):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.size += entry.size
+        while len(self._entries) > self.max_entries or self.size > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.size -= entry.size
+
+    def dump(self, max_entry_size=SNAPSHOT_MAX_ENTRY_SIZE, max_size=SNAPSHOT_MAX_SIZE) -> list:
+        """
+        Return the entries that can still be used, in a form that can be stored as JSON
+
+        Responses larger than `max_entry_size` are left out, and so are the least recently used
+        ones once `max_size` bytes of content have been returned.
+        """
+        offset = time() - monotonic()
+        entries = []
+        size = 0
+        for key, entry in reversed(self._entries.items()):
+            if entry.dropped or entry.size > max_entry_size:
+                continue
+            size += entry.size
+            if size > max_size:
+                break
+            response = entry.response
+            entries.append(
+                {
+                    "key": key,
+                    "url": str(response.request.url),
+                    "status": response.status_code,
+                    "headers": [
+                        [name, value]
+                        for name, value in response.headers.multi_items()
+                        if name.lower() not in _TRANSFER_HEADERS
+                    ],
+                    "content": base64.b64encode(response.content).decode("ascii"),
+                    # Monotonic times don't survive a restart
+                    "expires": entry.expires + offset,
+                    "stale_until": entry.stale_until + offset,
+                }
+            )
+        # Oldest first, so that they are loaded back in the same order
+        entries.reverse()
+        return entries
+
+    def load(self, entries: list):
+        """Add the entries returned by `dump`, with the same expiry times"""
+        offset = monotonic() - time()
+        for item in entries:
+            response = httpx.Response(
+                item["status"],
+                headers=item["headers"],
+                content=base64.b64decode(item["content"]),
+                request=httpx.Request("GET", item["url"]),
+            )
+            entry = CacheEntry(
+                response,
+                len(response.content),
+                item["expires"] + offset,
+                item["stale_until"] + offset,
+            )
+            if entry.dropped or entry.size > self.max_bytes:
+                continue
+            self._add(_hashable(item["key"]), entry)
+
+
+class TTLCache:
+    """
+    An in-memory mapping whose entries expire after `ttl` seconds
+
+    The least recently used entries are evicted when it holds more than `max_entries` of them.
+    A TTL of 0 disables it.
+    """
+
+    def __init__(self, max_entries=1024, ttl=300) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def get(self, key, default=None):
+        try:
+            expires, value = self._entries[key]
+        except KeyError:
+            return default
+        if monotonic() >= expires:
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if not ttl:
+            return
+        self._entries.pop(key, None)
+        self._entries[key] = (monotonic() + ttl, value)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """Remove the entry for the key, to stop serving a value that has changed"""
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        self._entries.clear()
+
+    def dump(self, encode=None) -> list:
+        """
+        Return the entries that have not expired, in a form that can be stored as JSON
+
+        The values are converted with `encode` if they can't be stored as they are.
+        """
+        now = monotonic()
+        offset = time() - now
+        return [
+            [key, encode(value) if encode else value, expires + offset]
+            for key, (expires, value) in self._entries.items()
+            if expires > now
+        ]
+
+    def load(self, entries: list, decode=None):
+        """Add the entries returned by `dump`, with the same expiry times"""
+        offset = monotonic() - time()
+        for key, value, expires in entries:
+            # The TTL may have been shortened since, or the cache disabled
+            ttl = min(expires + offset - monotonic(), self.ttl)
+            if ttl <= 0:
+                continue
+            self.set(_hashable(key), decode(value) if decode else value, ttl)
+
+
+def _hashable(key):
+    # Tuples are stored as lists in JSON
+    if isinstance(key, list):
+        return tuple(_hashable(item) for item in key)
+    return key
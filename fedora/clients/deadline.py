@@ -0,0 +1,32 @@
+import contextlib
+import time
+from contextvars import ContextVar
+
+# When the upstream calls of the current command must be done by, on the time.monotonic() clock
+_deadline: ContextVar[float | None] = ContextVar("deadline", default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds):
+    """
+    Give up on the upstream calls made in the block once `seconds` have passed
+
+    A deadline set by an enclosing block is only ever made shorter. A value of 0 does not set a
+    deadline.
+    """
+    until = _deadline.get()
+    if seconds:
+        until = min(time.monotonic() + seconds, until or float("inf"))
+    token = _deadline.set(until)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """The number of seconds left before the deadline, or None if there is no deadline"""
+    until = _deadline.get()
+    if until is None:
+        return None
+    return max(until - time.monotonic(), 0)
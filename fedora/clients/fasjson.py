@@ -1,74 +1,314 @@
+import asyncio
 import logging
+from collections.abc import AsyncIterator, Iterable
+from dataclasses import dataclass, field
 
 import httpx
-from httpx_gssapi import HTTPSPNEGOAuth
 
 from ..constants import MATRIX_USER_RE, NL
 from ..exceptions import InfoGatherError
+from ..matrixids import MatrixIdIndex
+from ..mentions import matrix_ids_from_ircnicks, tag_user
+from ..usersnapshot import SNAPSHOT_FIELDS, UserSnapshot
+from .base import BaseClient
+from .cache import TTLCache
+from .kerberos import SessionSPNEGOAuth
 
 log = logging.getLogger(__name__)
 
+# How many results to ask for in each page of the paginated endpoints
+PAGE_SIZE = 40
+
+# How many users to look up at the same time in get_users
+USERS_CONCURRENCY = 5
+
+# The fields of the group members that the bot displays
+MEMBER_FIELDS = ("username", "human_name", "ircnicks")
+
+# The fields of the users that the bot displays, the ones asked for by default
+USER_FIELDS = (
+    "username",
+    "human_name",
+    "pronouns",
+    "creation",
+    "timezone",
+    "locale",
+    "gpgkeyids",
+    "ircnicks",
+)
+
+
+def user_fields(fields: Iterable[str]) -> tuple[str, ...]:
+    """The fields to ask FASJSON for, always with the username"""
+    return tuple(sorted({"username", *fields}))
+
+
+@dataclass
+class CachedUser:
+    # The fields that were asked for, the user may not have them all set
+    fields: frozenset[str]
+    user: dict
+    # Computed once, to render the mentions of the user without parsing their ircnicks again
+    mxids: tuple[str, ...] = field(init=False, repr=False, compare=False)
+    # The mention of the user with each of their Matrix IDs, by Matrix ID
+    mentions: dict[str, str] = field(init=False, repr=False, compare=False)
+    # The mention of the user when it's not known which Matrix ID to use
+    mention: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        username = self.user["username"]
+        self.mxids = tuple(matrix_ids_from_ircnicks(self.user.get("ircnicks")))
+        name = self.user.get("human_name", username)
+        self.mentions = {mxid: tag_user(mxid, name) for mxid in self.mxids}
+        if len(self.mxids) == 0:
+            self.mention = username
+        elif len(self.mxids) == 1:
+            self.mention = self.mentions[self.mxids[0]]
+        else:
+            self.mention = f"{username} ({', '.join(tag_user(mxid) for mxid in self.mxids)})"
+
+    def to_json(self) -> dict:
+        return {"fields": sorted(self.fields), "user": self.user}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "CachedUser":
+        return cls(frozenset(data["fields"]), data["user"])
+
 
 class NoResult(Exception):
     def __init__(self, response):
         self.response = response
 
 
-class FasjsonClient:
-    def __init__(self, baseurl):
-        self.baseurl = f"{baseurl}/v1/"
+class FasjsonClient(BaseClient):
+    name = "fasjson"
+
+    def __init__(
+        self,
+        baseurl,
+        upstream=None,
+        users: TTLCache | None = None,
+        matrix_ids: MatrixIdIndex | None = None,
+        missing: TTLCache | None = None,
+        snapshot: UserSnapshot | None = None,
+    ):
+        super().__init__(f"{baseurl}/v1/", upstream=upstream)
+        # Shared between requests so that the authenticated session is reused
+        self.auth = SessionSPNEGOAuth()
+        # Users are only cached, by username, when the client is given a cache
+        self.users = users
+        # Matrix IDs are only searched for once when the client is given an index
+        self.matrix_ids = matrix_ids
+        # The users, groups and Matrix IDs that were recently not found. They are only set when
+        # FASJSON doesn't find them, so that looking them up again doesn't extend their TTL. A
+        # disabled cache doesn't remember anything.
+        self.missing = missing if missing is not None else TTLCache(ttl=0)
+        # The users are looked up in the snapshot first when the client is given one, if it has
+        # the fields that are asked for
+        self.snapshot = snapshot
+
+    def _cached_user(self, username, fields: tuple[str, ...]) -> dict | None:
+        if self.users is None:
+            return None
+        cached = self.users.get(username)
+        if cached is None or not cached.fields.issuperset(fields):
+            return None
+        return cached.user
+
+    def _remember_user(self, user, fields: tuple[str, ...], username=None):
+        user = {field: user[field] for field in fields if field in user}
+        if self.users is not None:
+            self.users.set(username or user["username"], CachedUser(frozenset(fields), user))
+        return user
+
+    def remember_member(self, member: dict) -> CachedUser:
+        """Return the cached entry of a group member, replacing it if the member has changed"""
+        fields = user_fields(MEMBER_FIELDS)
+        if self.users is not None and (cached := self.users.get(member["username"])) is not None:
+            if cached.fields.issuperset(fields) and all(
+                cached.user.get(name) == member.get(name) for name in fields
+            ):
+                return cached
+        entry = CachedUser(
+            frozenset(fields), {name: member[name] for name in fields if name in member}
+        )
+        if self.users is not None:
+            self.users.set(member["username"], entry)
+        return entry
+
+    async def _get_pages(
+        self, endpoint, params=None, page_size=PAGE_SIZE, page=1, **kwargs
+    ) -> AsyncIterator[tuple[list[dict], int | None]]:
+        """
+        Yield the results of a paginated endpoint page by page, with the number of results
+
+        The pages are fetched as they are iterated over, starting from the `page` number.
+        """
+        page_number = page
+        while True:
+            response = await self._get(
+                endpoint,
+                params={**(params or {}), "page_size": page_size, "page": page_number},
+                **kwargs,
+            )
+            body = response.json()
+            # Unpaginated responses have no page information, they hold every result
+            page_info = body.get("page") or {}
+            yield body.get("result"), page_info.get("total_results")
+            if page_number >= page_info.get("total_pages", page_number):
+                return
+            page_number += 1
 
     async def _get(self, endpoint, **kwargs):
         kwargs["follow_redirects"] = True
-        kwargs["auth"] = HTTPSPNEGOAuth()
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint + "/", **kwargs)
-            if response.status_code == 404:
-                raise NoResult(response)
-            if response.status_code >= 400:
-                log.error(f"FASJSON response to {response.url}: {response.text}")
-                raise InfoGatherError(
-                    f"Sorry, could not get info from FASJSON (code {response.status_code})"
-                )
-            pass
+        kwargs["auth"] = self.auth
+        response = await super()._get(endpoint + "/", **kwargs)
+        if response.status_code == 404:
+            raise NoResult(response)
+        if response.status_code >= 400:
+            log.error(f"FASJSON response to {response.url}: {response.text}")
+            raise InfoGatherError(
+                f"Sorry, could not get info from FASJSON (code {response.status_code})"
+            )
         return response
 
+    def _group_not_found(self, groupname):
+        return InfoGatherError(f"Sorry, but group '{groupname}' does not exist")
+
+    def _user_not_found(self, username):
+        return InfoGatherError(f"Sorry, but Fedora Accounts user '{username}' does not exist")
+
     async def get_group_membership(self, groupname, membership_type="members", params=None):
         """looks up a group membership (members or sponsors) by the groupname"""
+        if ("group", groupname) in self.missing:
+            raise self._group_not_found(groupname)
         try:
             response = await self._get(
                 "/".join(["groups", groupname, membership_type]),
                 params=params,
-                headers={"X-Fields": "username,human_name,ircnicks"},
+                headers={"X-Fields": ",".join(MEMBER_FIELDS)},
+                cache="group_membership",
             )
         except NoResult as e:
-            raise InfoGatherError(f"Sorry, but group '{groupname}' does not exist") from e
+            self.missing.set(("group", groupname), True)
+            raise self._group_not_found(groupname) from e
         return response.json().get("result")
 
+    async def iter_group_membership(
+        self, groupname, membership_type="members", page_size=PAGE_SIZE, page=1
+    ) -> AsyncIterator[tuple[list[dict], int | None]]:
+        """Yield the pages of a group membership (members or sponsors), with the number of users"""
+        if ("group", groupname) in self.missing:
+            raise self._group_not_found(groupname)
+        pages = self._get_pages(
+            "/".join(["groups", groupname, membership_type]),
+            page_size=page_size,
+            page=page,
+            headers={"X-Fields": ",".join(MEMBER_FIELDS)},
+            cache="group_membership",
+        )
+        try:
+            async for page in pages:
+                yield page
+        except NoResult as e:
+            self.missing.set(("group", groupname), True)
+            raise self._group_not_found(groupname) from e
+
     async def get_group(self, groupname, params=None):
         """looks up a group by the groupname"""
+        if ("group", groupname) in self.missing:
+            raise self._group_not_found(groupname)
         try:
-            response = await self._get("/".join(["groups", groupname]), params=params)
+            response = await self._get(
+                "/".join(["groups", groupname]), params=params, cache="group"
+            )
         except NoResult as e:
-            raise InfoGatherError(f"Sorry, but group '{groupname}' does not exist") from e
+            self.missing.set(("group", groupname), True)
+            raise self._group_not_found(groupname) from e
         return response.json().get("result")
 
-    async def get_user(self, username, params=None):
-        """looks up a group by the groupname"""
+    async def get_user(self, username, params=None, fields=USER_FIELDS):
+        """
+        looks up a user by the username
+
+        Only the `fields` of the user are asked for, or the whole user if `fields` is None.
+        """
+        if fields is None:
+            headers = None
+        else:
+            fields = user_fields(fields)
+            if params is None and (user := self._cached_user(username, fields)) is not None:
+                return user
+            if self.users is not None and (cached := self.users.get(username)) is not None:
+                # Ask for the cached fields too so that the entry can be replaced
+                fields = user_fields({*fields, *cached.fields})
+            if params is None and self.snapshot is not None and set(fields) <= {*SNAPSHOT_FIELDS}:
+                if (user := await self.snapshot.get(username)) is not None:
+                    return self._remember_user(user, fields, username)
+            headers = {"X-Fields": ",".join(fields)}
+        if ("user", username) in self.missing:
+            raise self._user_not_found(username)
         try:
-            response = await self._get("/".join(["users", username]), params=params)
+            response = await self._get(
+                "/".join(["users", username]), params=params, headers=headers, cache="user"
+            )
         except NoResult as e:
-            raise InfoGatherError(
-                f"Sorry, but Fedora Accounts user '{username}' does not exist"
-            ) from e
-        return response.json().get("result")
+            self.missing.set(("user", username), True)
+            raise self._user_not_found(username) from e
+        user = response.json().get("result")
+        if params is not None or fields is None:
+            return user
+        return self._remember_user(user, fields, username)
 
-    async def search_users(self, params=None):
-        """looks up a group by the groupname"""
-        response = await self._get("/".join(["search", "users"]), params=params)
+    async def get_users(
+        self, names: list[str], max_concurrency=USERS_CONCURRENCY, fields=USER_FIELDS
+    ) -> list[dict | InfoGatherError | httpx.HTTPError]:
+        """
+        looks up many users at once, by username or matrix id
+
+        The results are in the order of the names, with an InfoGatherError for the users that
+        could not be found and the httpx error for those that failed to be looked up. Each name
+        is only looked up once.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def _lookup(name):
+            async with semaphore:
+                try:
+                    if MATRIX_USER_RE.match(name):
+                        return await self.get_users_by_matrix_id(name, fields=fields)
+                    return await self.get_user(name, fields=fields)
+                except (InfoGatherError, httpx.HTTPError) as e:
+                    return e
+
+        unique = list(dict.fromkeys(names))
+        found = await asyncio.gather(*[_lookup(name) for name in unique])
+        results = dict(zip(unique, found, strict=True))
+        return [results[name] for name in names]
+
+    async def iter_users(
+        self, fields=USER_FIELDS, page_size=PAGE_SIZE
+    ) -> AsyncIterator[tuple[list[dict], int | None]]:
+        """Yield the pages of all the users, with the number of users"""
+        pages = self._get_pages(
+            "users", page_size=page_size, headers={"X-Fields": ",".join(user_fields(fields))}
+        )
+        async for page in pages:
+            yield page
+
+    async def search_users(self, params=None, fields=USER_FIELDS):
+        """
+        searches for users
+
+        Only the `fields` of the users are asked for, or the whole users if `fields` is None.
+        """
+        headers = None if fields is None else {"X-Fields": ",".join(user_fields(fields))}
+        response = await self._get(
+            "/".join(["search", "users"]), params=params, headers=headers, cache="user_search"
+        )
         return response.json().get("result")
 
-    async def get_users_by_matrix_id(self, matrix_id: str) -> dict | str:
+    async def get_users_by_matrix_id(self, matrix_id: str, fields=USER_FIELDS) -> dict | str:
         """looks up a user by the matrix id"""
 
         # Fedora Accounts stores these strangly but this is to handle that
@@ -82,11 +322,34 @@ class FasjsonClient:
 
         # if given a fedora.im address -- just look up the username as a FAS name
         if matrix_server == "fedora.im":
-            user = await self.get_user(matrix_username)
+            user = await self.get_user(matrix_username, fields=fields)
             return user
 
+        fields = user_fields(fields)
+
+        if self.snapshot is not None and set(fields) <= {*SNAPSHOT_FIELDS}:
+            found = await self.snapshot.get_by_matrix_id(matrix_id)
+            if len(found) == 1:
+                return self._remember_user(found[0], fields)
+
         searchterm = f"matrix://{matrix_server}/{matrix_username}"
-        searchresult = await self.search_users(params={"ircnick__exact": searchterm})
+        if self.matrix_ids is not None and (known := await self.matrix_ids.get(matrix_id)):
+            username, stale = known
+            if stale:
+                self.upstream.run_in_background(
+                    self._search_matrix_id(matrix_id, searchterm, fields)
+                )
+            try:
+                return await self.get_user(username, fields=fields)
+            except InfoGatherError:
+                # The account may have been renamed or deleted, search for it again
+                log.info(f"Could not get {username}, who had {matrix_id}, searching again")
+        if ("matrix_id", matrix_id) in self.missing:
+            searchresult = []
+        else:
+            searchresult = await self._search_matrix_id(matrix_id, searchterm, fields)
+            if not searchresult:
+                self.missing.set(("matrix_id", matrix_id), True)
 
         if len(searchresult) > 1:
             names = f"{NL}".join([name["username"] for name in searchresult])
@@ -100,4 +363,15 @@ class FasjsonClient:
                 f"No Fedora Accounts users have the {matrix_id} Matrix Account defined"
             )
 
-        return searchresult[0]
+        return self._remember_user(searchresult[0], fields)
+
+    async def _search_matrix_id(
+        self, matrix_id: str, searchterm: str, fields: tuple[str, ...]
+    ) -> list[dict]:
+        searchresult = await self.search_users(params={"ircnick__exact": searchterm}, fields=fields)
+        if self.matrix_ids is not None:
+            if len(searchresult) == 1:
+                await self.matrix_ids.set(matrix_id, searchresult[0]["username"])
+            else:
+                await self.matrix_ids.remove(matrix_id)
+        return searchresult
@@ -3,17 +3,15 @@ from typing import Literal
 import httpx
 
 from ..exceptions import InfoGatherError
+from .base import BaseClient
 
 
-class FedoraStatusClient:
-    def __init__(self, baseurl):
-        self.baseurl = baseurl
+class FedoraStatusClient(BaseClient):
+    name = "fedorastatus"
 
     async def _get(self, endpoint, **kwargs) -> httpx.Response:
         kwargs.setdefault("headers", {})["Content-Type"] = "application/json"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint, **kwargs)
-        return response
+        return await super()._get(endpoint, **kwargs)
 
     def _check_errors(self, response):
         if response.status_code != 200:
@@ -22,9 +20,7 @@ class FedoraStatusClient:
             )
 
     async def get_outages(self, outagetype: Literal["ongoing", "planned", "resolved"]):
-        outages = await self._get(
-            f"/{outagetype}.json",
-        )
+        outages = await self._get(f"/{outagetype}.json", cache="outages")
         self._check_errors(outages)
 
         return outages.json()
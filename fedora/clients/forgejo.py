@@ -1,16 +1,12 @@
-import httpx
-
 from ..exceptions import InfoGatherError
+from .base import BaseClient
 
 
-class ForgejoClient:
-    def __init__(self, baseurl):
-        self.baseurl = f"{baseurl}/api/v1/repos/"
+class ForgejoClient(BaseClient):
+    name = "forgejo"
 
-    async def _get(self, endpoint, **kwargs):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint, **kwargs)
-        return response
+    def __init__(self, baseurl, upstream=None):
+        super().__init__(f"{baseurl}/api/v1/repos/", upstream=upstream)
 
     def _check_errors(self, response):
         if response.status_code == 404:
@@ -24,6 +20,7 @@ class ForgejoClient:
         response = await self._get(
             "/".join(filter(None, [org, repo, "issues", issue_id])),
             params=params,
+            cache="issue",
         )
         self._check_errors(response)
         return response.json()
@@ -32,6 +29,7 @@ class ForgejoClient:
         response = await self._get(
             "/".join(filter(None, [org, repo, "pulls", pull_id])),
             params=params,
+            cache="pull_request",
         )
         self._check_errors(response)
         return response.json()
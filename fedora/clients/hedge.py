@@ -0,0 +1,101 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable, Callable
+from contextlib import AbstractAsyncContextManager, nullcontext
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+# How many recent requests the latency percentile and the hedge rate are computed on
+WINDOW = 200
+# Don't hedge until this many latencies have been measured
+MIN_SAMPLES = 20
+
+
+class Hedger:
+    """
+    Send a second copy of the slow requests to an upstream, and use whichever answers first
+
+    A request is hedged when it has not been answered after the `percentile` of the recent
+    latencies of the upstream. At most `max_rate` of the requests are hedged, so that a slow
+    upstream doesn't get twice the load. A percentile of 0 disables hedging. Only use it for
+    requests that are safe to send twice.
+
+    Each copy is sent within `limit`, the rate limiter of the upstream. The time spent waiting
+    for it is neither measured nor counted before hedging, so that a long queue doesn't make
+    the requests look slow and get them hedged.
+    """
+
+    def __init__(self, name, percentile=0, max_rate=0.05) -> None:
+        self.name = name
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.latencies: deque[float] = deque(maxlen=WINDOW)
+        # Whether each of the recent requests was hedged
+        self.history: deque[bool] = deque(maxlen=WINDOW)
+        self.hedges = 0
+
+    def delay(self) -> float | None:
+        """How long to wait before hedging a request, or None if it should not be hedged"""
+        if not self.percentile or len(self.latencies) < MIN_SAMPLES:
+            return None
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * self.percentile / 100), len(latencies) - 1)]
+
+    def _may_hedge(self) -> bool:
+        return sum(self.history) < self.max_rate * len(self.history)
+
+    async def _send(
+        self,
+        func: Callable[[], Awaitable[httpx.Response]],
+        limit: Callable[[], AbstractAsyncContextManager],
+        started: asyncio.Event | None = None,
+    ) -> httpx.Response:
+        async with limit():
+            if started is not None:
+                started.set()
+            start = time.monotonic()
+            response = await func()
+            self.latencies.append(time.monotonic() - start)
+            return response
+
+    async def call(
+        self,
+        func: Callable[[], Awaitable[httpx.Response]],
+        limit: Callable[[], AbstractAsyncContextManager] = nullcontext,
+    ) -> httpx.Response:
+        delay = self.delay()
+        if delay is None:
+            return await self._send(func, limit)
+        started = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._send(func, limit, started))]
+        waiting = asyncio.ensure_future(started.wait())
+        try:
+            # Only count the delay once the first copy has been let through by the limiter
+            await asyncio.wait([tasks[0], waiting], return_when=asyncio.FIRST_COMPLETED)
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            hedge = not done and self._may_hedge()
+            self.history.append(hedge)
+            if hedge:
+                self.hedges += 1
+                log.debug(f"Hedging a request to {self.name} after {delay:.3f}s")
+                tasks.append(asyncio.ensure_future(self._send(func, limit)))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.cancelled() and task.exception() is None:
+                        return task.result()
+            # Every copy failed
+            return tasks[0].result()
+        finally:
+            waiting.cancel()
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    # Mark the exception of the losing copy as retrieved
+                    task.exception()
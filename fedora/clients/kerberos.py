@@ -0,0 +1,104 @@
+import asyncio
+import contextlib
+import logging
+
+import gssapi
+from gssapi.exceptions import GSSError
+from httpx_gssapi import HTTPSPNEGOAuth
+
+log = logging.getLogger(__name__)
+
+# The cookie mod_auth_gssapi gives us once a request has been authenticated
+SESSION_COOKIE = "gssapi_session"
+
+
+def get_lifetime(creds):
+    """Return the number of seconds the credentials are still valid for"""
+    try:
+        return creds.lifetime
+    except GSSError:
+        return 0
+
+
+class SessionSPNEGOAuth(HTTPSPNEGOAuth):
+    """
+    SPNEGO authentication that reuses the session given by the server
+
+    While we hold a session cookie we don't negotiate again, unless the server rejects it or the
+    credentials get close to their expiry. Once a negotiation has succeeded, the following ones
+    send the token right away instead of waiting for the 401 challenge.
+    """
+
+    def __init__(self, min_lifetime=600, **kwargs):
+        super().__init__(**kwargs)
+        self.min_lifetime = min_lifetime
+        self.renegotiate = False
+
+    def set_credentials(self, creds):
+        if self.creds is not None and get_lifetime(self.creds) < self.min_lifetime:
+            log.debug("The Kerberos credentials were expiring, negotiating a new session")
+            self.renegotiate = True
+        self.creds = creds
+
+    def handle_mutual_auth(self, response, ctx):
+        super().handle_mutual_auth(response, ctx)
+        self.opportunistic_auth = True
+
+    def auth_flow(self, request):
+        if self.renegotiate or SESSION_COOKIE not in request.headers.get("Cookie", ""):
+            self.renegotiate = False
+            yield from super().auth_flow(request)
+            return
+        response = yield request
+        if response.status_code == 401:
+            log.debug("The session cookie was rejected, negotiating a new session")
+            yield from self.handle_response(response)
+
+
+class CredentialsRenewer:
+    """Renew the Kerberos credentials in the background, so that requests never wait for them"""
+
+    def __init__(self, auth, keytab=None, ccache=None, interval=300) -> None:
+        self.auth = auth
+        self.interval = interval
+        self.store = {}
+        if keytab:
+            self.store["client_keytab"] = keytab
+        if ccache:
+            self.store["ccache"] = ccache
+        self._task: asyncio.Task | None = None
+
+    def acquire(self):
+        # With a client keytab, this gets a new ticket when the current one is close to expiry
+        return gssapi.Credentials(usage="initiate", store=self.store or None)
+
+    async def renew(self):
+        loop = asyncio.get_running_loop()
+        try:
+            creds = await loop.run_in_executor(None, self.acquire)
+        except GSSError as e:
+            log.error(f"Could not renew the Kerberos credentials: {e.gen_message()}")
+            return
+        lifetime = get_lifetime(creds)
+        if lifetime < self.auth.min_lifetime:
+            log.warning(f"The Kerberos credentials expire in {lifetime} seconds")
+        self.auth.set_credentials(creds)
+
+    async def _run(self):
+        while True:
+            await self.renew()
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if not self.interval:
+            log.info("The renewal of the Kerberos credentials is disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
@@ -1,16 +1,12 @@
-import httpx
-
 from ..exceptions import InfoGatherError
+from .base import BaseClient
 
 
-class PagureClient:
-    def __init__(self, baseurl):
-        self.baseurl = f"{baseurl}/api/0/"
+class PagureClient(BaseClient):
+    name = "pagure"
 
-    async def _get(self, endpoint, **kwargs):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(self.baseurl + endpoint, **kwargs)
-        return response
+    def __init__(self, baseurl, upstream=None):
+        super().__init__(f"{baseurl}/api/0/", upstream=upstream)
 
     def _check_errors(self, response):
         if response.status_code == 404:
@@ -24,6 +20,7 @@ class PagureClient:
         response = await self._get(
             "/".join(filter(None, [namespace, project, "issue", issue_id])),
             params=params,
+            cache="issue",
         )
         self._check_errors(response)
         return response.json()
@@ -32,6 +29,7 @@ class PagureClient:
         response = await self._get(
             "/".join(filter(None, [namespace, project])),
             params=params,
+            cache="project",
         )
         self._check_errors(response)
         return response.json()
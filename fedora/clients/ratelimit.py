@@ -0,0 +1,70 @@
+import asyncio
+import contextlib
+import logging
+import time
+
+from ..exceptions import InfoGatherError
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Limit the requests sent to an upstream
+
+    At most `max_concurrency` requests are in flight at once, and they are started at `rate`
+    requests per second on average, with bursts of up to `burst` requests (a token bucket).
+    Requests over the limits wait in line for at most `max_queue_wait` seconds, after which they
+    fail with InfoGatherError. A `max_concurrency` or a `rate` of 0 disables that limit.
+    """
+
+    def __init__(self, name, max_concurrency=10, rate=10, burst=20, max_queue_wait=10) -> None:
+        self.name = name
+        self.max_queue_wait = max_queue_wait
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self._tokens_lock = asyncio.Lock()
+
+    async def _take_token(self):
+        if not self.rate:
+            return
+        # The lock makes the requests wait for their token in order
+        async with self._tokens_lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    async def _acquire(self):
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        try:
+            await self._take_token()
+        except BaseException:
+            self._release()
+            raise
+
+    def _release(self):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+    @contextlib.asynccontextmanager
+    async def limit(self):
+        try:
+            await asyncio.wait_for(self._acquire(), self.max_queue_wait or None)
+        except asyncio.TimeoutError as e:
+            log.warning(f"Request to {self.name} waited more than {self.max_queue_wait}s to go")
+            raise InfoGatherError(
+                f"Sorry, {self.name} is too busy at the moment, please try again later"
+            ) from e
+        try:
+            yield
+        finally:
+            self._release()
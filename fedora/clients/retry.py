@@ -0,0 +1,76 @@
+import logging
+from collections.abc import Awaitable, Callable
+
+import backoff
+import httpx
+
+from .deadline import remaining
+
+log = logging.getLogger(__name__)
+
+# The errors after which a GET request can safely be sent again
+RETRY_ERRORS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+RETRY_STATUSES = {502, 503, 504}
+# How many retries can be saved up in the budget
+BUDGET_CAP = 10
+
+
+class RetryableStatus(Exception):
+    def __init__(self, response: httpx.Response):
+        self.response = response
+
+
+class RetryPolicy:
+    """
+    Retry the requests to an upstream that failed in a way that is safe to retry
+
+    Connection errors, timeouts and 502, 503 or 504 responses are tried again, up to `max_tries`
+    times in total, after an exponential backoff with full jitter starting at `delay` seconds
+    and capped at `max_delay`. Each request earns `budget` of a retry, and retries are only made
+    while there is one in the budget, so that they can't multiply the load on a failing
+    upstream. Retries stop at the deadline of the command. A `max_tries` of 1 disables retries.
+    """
+
+    def __init__(self, name, max_tries=3, delay=0.1, max_delay=2, budget=0.2) -> None:
+        self.name = name
+        self.budget = budget
+        self.tokens = float(BUDGET_CAP)
+        self.retries = 0
+        self._retrying = backoff.on_exception(
+            backoff.expo,
+            (*RETRY_ERRORS, RetryableStatus),
+            max_tries=max_tries,
+            giveup=self._giveup,
+            on_backoff=self._on_backoff,
+            logger=None,
+            factor=delay,
+            max_value=max_delay,
+        )(self._attempt)
+
+    def _giveup(self, e):
+        # Out of budget, or out of time to wait for another try
+        return self.tokens < 1 or remaining() == 0
+
+    def _on_backoff(self, details):
+        self.tokens -= 1
+        self.retries += 1
+        exception = details["exception"]
+        if isinstance(exception, RetryableStatus):
+            error = f"status {exception.response.status_code}"
+        else:
+            error = repr(exception)
+        log.warning(f"Request to {self.name} failed ({error}), retrying in {details['wait']:.2f}s")
+
+    async def _attempt(self, func: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        response = await func()
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableStatus(response)
+        return response
+
+    async def call(self, func: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        self.tokens = min(self.tokens + self.budget, BUDGET_CAP)
+        try:
+            return await self._retrying(func)
+        except RetryableStatus as e:
+            # Out of tries, the caller handles the error response
+            return e.response
@@ -0,0 +1,29 @@
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any
+
+
+class SingleFlight:
+    """
+    Share the result of identical calls made while one of them is in flight
+
+    The first caller for a key starts the call, the following ones wait for its result or its
+    exception. A waiter being cancelled does not cancel the call for the others.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    def _done(self, key, future):
+        self._calls.pop(key, None)
+        if not future.cancelled():
+            # Mark the exception as retrieved, in case every waiter was cancelled
+            future.exception()
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(func())
+            self._calls[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        return await asyncio.shield(future)
@@ -0,0 +1,132 @@
+import asyncio
+import contextvars
+import logging
+
+import httpx
+
+from .breaker import CircuitBreaker
+from .hedge import Hedger
+from .ratelimit import RateLimiter
+from .retry import RetryPolicy
+from .singleflight import SingleFlight
+
+log = logging.getLogger(__name__)
+
+# Settings used for every upstream, unless overridden in the "upstreams" section of the config
+DEFAULT_SETTINGS = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30,
+    "http2": False,
+    "connect_timeout": 5,
+    "read_timeout": 10,
+    "breaker_threshold": 5,
+    "breaker_recovery_timeout": 30,
+    "max_concurrency": 10,
+    "rate": 10,
+    "burst": 20,
+    "max_queue_wait": 10,
+    "hedge_percentile": 0,
+    "hedge_max_rate": 0.05,
+    "retry_max_tries": 3,
+    "retry_delay": 0.1,
+    "retry_max_delay": 2,
+    "retry_budget": 0.2,
+}
+
+
+class Upstream:
+    """The state shared by all the requests made to one upstream service"""
+
+    def __init__(self, name, settings=None, cache=None) -> None:
+        self.name = name
+        # Responses are only cached when the upstream is given a cache
+        self.cache = cache
+        self.settings = {**DEFAULT_SETTINGS, **(settings or {})}
+        self._http: httpx.AsyncClient | None = None
+        # Identical requests in flight at the same time are only sent once
+        self.singleflight = SingleFlight()
+        self.breaker = CircuitBreaker(
+            name,
+            threshold=self.settings["breaker_threshold"],
+            recovery_timeout=self.settings["breaker_recovery_timeout"],
+        )
+        self.limiter = RateLimiter(
+            name,
+            max_concurrency=self.settings["max_concurrency"],
+            rate=self.settings["rate"],
+            burst=self.settings["burst"],
+            max_queue_wait=self.settings["max_queue_wait"],
+        )
+        self.hedger = Hedger(
+            name,
+            percentile=self.settings["hedge_percentile"],
+            max_rate=self.settings["hedge_max_rate"],
+        )
+        self.retry = RetryPolicy(
+            name,
+            max_tries=self.settings["retry_max_tries"],
+            delay=self.settings["retry_delay"],
+            max_delay=self.settings["retry_max_delay"],
+            budget=self.settings["retry_budget"],
+        )
+        self._background_tasks: set[asyncio.Future] = set()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Created on first use, so that unused upstreams don't cost anything
+        if self._http is None:
+            limits = httpx.Limits(
+                max_connections=self.settings["max_connections"],
+                max_keepalive_connections=self.settings["max_keepalive_connections"],
+                keepalive_expiry=self.settings["keepalive_expiry"],
+            )
+            timeout = httpx.Timeout(
+                self.settings["read_timeout"], connect=self.settings["connect_timeout"]
+            )
+            try:
+                # Servers that don't negotiate h2 are still talked to with HTTP/1.1
+                self._http = httpx.AsyncClient(
+                    limits=limits, timeout=timeout, http2=self.settings["http2"]
+                )
+            except ImportError:
+                log.warning(f"The h2 package is not installed, {self.name} will use HTTP/1.1")
+                self._http = httpx.AsyncClient(limits=limits, timeout=timeout)
+        return self._http
+
+    def run_in_background(self, coro):
+        # In a new context, so that the deadline of the current command doesn't apply
+        task = contextvars.Context().run(asyncio.ensure_future, coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_task_done)
+
+    def _background_task_done(self, task):
+        self._background_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            log.warning(f"Background request to {self.name} failed: {task.exception()!r}")
+
+    async def aclose(self):
+        for task in list(self._background_tasks):
+            task.cancel()
+        if self._http is not None:
+            await self._http.aclose()
+
+
+class Upstreams:
+    """The upstreams used by the plugin, created on first use and kept alive until closed"""
+
+    def __init__(self, config=None, cache=None) -> None:
+        self.config = config or {}
+        self.cache = cache
+        self._upstreams: dict[str, Upstream] = {}
+
+    def __getitem__(self, name) -> Upstream:
+        if name not in self._upstreams:
+            settings = {**(self.config.get("default") or {}), **(self.config.get(name) or {})}
+            self._upstreams[name] = Upstream(name, settings, cache=self.cache)
+        return self._upstreams[name]
+
+    async def aclose(self):
+        for upstream in self._upstreams.values():
+            await upstream.aclose()
+        self._upstreams.clear()
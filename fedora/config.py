@@ -12,3 +12,22 @@ class Config(BaseProxyConfig):
         helper.copy("bodhi_url")
         helper.copy("fedorastatus_url")
         helper.copy("controlroom")
+        helper.copy("command_timeout")
+        helper.copy("fasjson_kerberos.keytab")
+        helper.copy("fasjson_kerberos.ccache")
+        helper.copy("fasjson_kerberos.renew_interval")
+        helper.copy("fasjson_kerberos.min_lifetime")
+        helper.copy_dict("upstreams")
+        helper.copy("cache.max_entries")
+        helper.copy("cache.max_bytes")
+        helper.copy_dict("cache.ttl", override_existing_map=False)
+        helper.copy_dict("cache.max_stale", override_existing_map=False)
+        helper.copy("user_cache.max_entries")
+        helper.copy("user_cache.ttl")
+        helper.copy("missing_cache.max_entries")
+        helper.copy("missing_cache.ttl")
+        helper.copy("matrix_id_refresh")
+        helper.copy("cache_snapshot_interval")
+        helper.copy("fas_snapshot.interval")
+        helper.copy("fas_snapshot.max_age")
+        helper.copy("fas_snapshot.page_size")
@@ -12,7 +12,7 @@ from .constants import NL
 from .db import UNIQUE_ERROR
 from .exceptions import InfoGatherError, InvalidInput
 from .fedmsg import publish
-from .handler import Handler
+from .handler import Handler, with_deadline
 from .utils import get_fasuser, get_fasuser_from_matrix_id, is_text_message
 
 log = logging.getLogger(__name__)
@@ -28,11 +28,12 @@ COOKIE_EMOJI = "🍪"
 class CookieHandler(Handler):
     def __init__(self, plugin):
         super().__init__(plugin)
-        self.bodhi = BodhiClient(plugin.config["bodhi_url"])
+        self.bodhi = BodhiClient(plugin.config["bodhi_url"], upstream=plugin.upstreams["bodhi"])
 
     # The event.on() decorator is not correctly typed and doesn't understand
     # this is a bound method.
     @event.on(EventType.ROOM_MESSAGE)  # type: ignore[arg-type]
+    @with_deadline
     async def handle(self, evt: MessageEvent) -> None:
         if not is_text_message(evt.content):
             return
@@ -44,13 +45,14 @@ class CookieHandler(Handler):
             return
         await evt.mark_read()
         try:
-            to_user = await get_fasuser(username, evt, self.plugin.fasjsonclient)
+            to_user = await get_fasuser(username, evt, self.plugin.fasjsonclient, fields=())
             response = await self.give(evt.sender, to_user["username"])
         except (InfoGatherError, InvalidInput) as e:
             response = e.message
         await evt.respond(response)
 
     @event.on(EventType.REACTION)  # type: ignore[arg-type]
+    @with_deadline
     async def handle_emoji(self, evt: MessageEvent) -> None:
         reaction = evt.content.relates_to
         emoji = reaction.key
@@ -59,7 +61,7 @@ class CookieHandler(Handler):
         message_event = await self.plugin.client.get_event(evt.room_id, reaction.event_id)
         try:
             to_user = await get_fasuser_from_matrix_id(
-                message_event.sender, self.plugin.fasjsonclient
+                message_event.sender, self.plugin.fasjsonclient, fields=()
             )
             response = await self.give(evt.sender, to_user["username"])
         except (InfoGatherError, InvalidInput) as e:
@@ -100,7 +102,7 @@ class CookieHandler(Handler):
 
     async def give(self, sender: str, to_user: str) -> str:
         sender = unquote(sender)
-        from_user = await get_fasuser_from_matrix_id(sender, self.plugin.fasjsonclient)
+        from_user = await get_fasuser_from_matrix_id(sender, self.plugin.fasjsonclient, fields=())
         from_user = from_user["username"]
         if from_user == to_user:
             raise InvalidInput("You can't give a cookie to yourself")
@@ -146,12 +148,13 @@ class CookieHandler(Handler):
 
     @cookie.subcommand(name="give", help="Give a cookie to another Fedora contributor")
     @command.argument("username", required=True)
+    @with_deadline
     async def cookie_give(self, evt: MessageEvent, username: str) -> None:
         if not username:
             await evt.respond("username argument is required. e.g. `!cookie give mattdm`")
             return
         try:
-            to_user = await get_fasuser(username, evt, self.plugin.fasjsonclient)
+            to_user = await get_fasuser(username, evt, self.plugin.fasjsonclient, fields=())
             response = await self.give(evt.sender, to_user["username"])
         except (InfoGatherError, InvalidInput) as e:
             response = e.message
@@ -159,9 +162,12 @@ class CookieHandler(Handler):
 
     @cookie.subcommand(name="count", help="Return the cookie count for a user")
     @command.argument("username", required=True)
+    @with_deadline
     async def cookie_count(self, evt: MessageEvent, username: str) -> None:
         try:
-            user = await get_fasuser(username or evt.sender, evt, self.plugin.fasjsonclient)
+            user = await get_fasuser(
+                username or evt.sender, evt, self.plugin.fasjsonclient, fields=()
+            )
         except InfoGatherError as e:
             await evt.respond(e.message)
             return
@@ -39,3 +39,49 @@ async def upgrade_v3(conn: Connection) -> None:
     await conn.execute("""
         CREATE INDEX idx_cookies_to_user ON cookies (to_user);
     """)
+
+
+@upgrade_table.register(description="Add the Matrix IDs index")  # type: ignore
+async def upgrade_v4(conn: Connection) -> None:
+    await conn.execute("""
+        CREATE TABLE matrix_ids (
+            mxid TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            updated BIGINT NOT NULL
+        )
+    """)
+
+
+@upgrade_table.register(description="Add the cache snapshots")  # type: ignore
+async def upgrade_v5(conn: Connection) -> None:
+    await conn.execute("""
+        CREATE TABLE cache_snapshots (
+            name TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        )
+    """)
+
+
+@upgrade_table.register(description="Add the snapshot of the Fedora Accounts users")  # type: ignore
+async def upgrade_v6(conn: Connection) -> None:
+    await conn.execute("""
+        CREATE TABLE fas_users (
+            username TEXT PRIMARY KEY,
+            data TEXT NOT NULL
+        )
+    """)
+    await conn.execute("""
+        CREATE TABLE fas_user_mxids (
+            mxid TEXT NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (mxid, username)
+        )
+    """)
+    await conn.execute("""
+        CREATE INDEX idx_fas_user_mxids_username ON fas_user_mxids (username);
+    """)
+    await conn.execute("""
+        CREATE TABLE fas_users_sync (
+            synced BIGINT NOT NULL
+        )
+    """)
@@ -4,16 +4,19 @@ from maubot.handlers import command
 from .clients.pagure import PagureClient
 from .constants import NL
 from .exceptions import InfoGatherError
-from .handler import Handler
+from .handler import Handler, with_deadline
 
 
 class DistGitHandler(Handler):
     def __init__(self, plugin):
         super().__init__(plugin)
-        self.paguredistgitclient = PagureClient(self.plugin.config["paguredistgit_url"])
+        self.paguredistgitclient = PagureClient(
+            self.plugin.config["paguredistgit_url"], upstream=plugin.upstreams["paguredistgit"]
+        )
 
     @command.new(help="Retrieve the owner of a given package")
     @command.argument("package", required=True)
+    @with_deadline
     async def whoowns(self, evt: MessageEvent, package: str) -> None:
         """
         Retrieve the owner of a given package
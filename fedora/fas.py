@@ -1,3 +1,4 @@
+import contextlib
 import logging
 from datetime import datetime
 
@@ -5,32 +6,49 @@ import pytz
 from maubot import MessageEvent
 from maubot.handlers import command
 
+from .clients.cache import TTLCache
 from .constants import NL
 from .exceptions import InfoGatherError
-from .handler import Handler
-from .utils import get_fasuser, inline_reply, matrix_ids_from_ircnicks, tag_user
+from .handler import Handler, with_deadline
+from .utils import get_fasuser, inline_reply
 
 log = logging.getLogger(__name__)
 
+# How many members of a group to list in each message
+MEMBERS_PAGE_SIZE = 200
+# How long `!group more` can be used after listing a group, and for how many users at once
+CURSOR_TTL = 600
+MAX_CURSORS = 256
+# How long to reuse the listing of a group in a room, in seconds, and how many to keep
+REPLY_TTL = 60
+MAX_REPLIES = 256
+# The fields of the users that the commands display
+HELLO_FIELDS = ("human_name", "pronouns")
+LOCALTIME_FIELDS = ("timezone",)
+
 
 class FasHandler(Handler):
+    def __init__(self, plugin):
+        super().__init__(plugin)
+        # The next page of the group listed last, by room and user, for `!group more`
+        self.cursors = TTLCache(max_entries=MAX_CURSORS, ttl=CURSOR_TTL)
+        # The pages of the groups listed recently, by room
+        self.replies = TTLCache(max_entries=MAX_REPLIES, ttl=REPLY_TTL)
+
     async def _get_mentions(self, users, evt: MessageEvent):
-        room_members = set((await evt.client.get_joined_members(evt.room_id)).keys())
+        room_members = await self.plugin.room_members.get(evt.client, evt.room_id)
         mentions = []
         for user in sorted(users, key=lambda u: u["username"]):
-            mxids = matrix_ids_from_ircnicks(user.get("ircnicks", []))
-            if len(mxids) == 0:
-                mention = user["username"]
-            elif len(mxids) == 1:
-                mention = tag_user(mxids[0], user.get("human_name", user["username"]))
-            elif len(set(mxids).intersection(room_members)) == 1:
-                mxid = next(iter(set(mxids).intersection(room_members)))
-                mention = tag_user(mxid, user.get("human_name", user["username"]))
-            else:
-                mention = f"{user['username']} ({', '.join(tag_user(mxid) for mxid in mxids)})"
+            entry = self.plugin.fasjsonclient.remember_member(user)
+            mention = entry.mention
+            if len(entry.mxids) > 1:
+                in_room = room_members.intersection(entry.mxids)
+                if len(in_room) == 1:
+                    mention = entry.mentions[in_room.pop()]
             mentions.append(mention)
         return mentions
 
+    @with_deadline
     async def _list_members(self, evt: MessageEvent, groupname: str, membership_type: str) -> None:
         """
         Return a list of the members or sponsors of the Fedora Accounts group
@@ -44,23 +62,87 @@ class FasHandler(Handler):
             return
 
         await evt.mark_read()
-
-        try:
-            users = await self.plugin.fasjsonclient.get_group_membership(
-                groupname, membership_type=membership_type
-            )
-        except InfoGatherError as e:
-            await evt.respond(e.message)
-            return
-
-        if len(users) > 200:
-            await evt.respond(
-                f"{groupname} has {len(users)} {membership_type} and thats too many to dump here"
-            )
-            return
+        await self._send_members_page(evt, groupname, membership_type, 1)
+
+    async def _send_members_page(
+        self,
+        evt: MessageEvent,
+        groupname: str,
+        membership_type: str,
+        page_number: int,
+        offset: int = 0,
+    ) -> None:
+        # Changes to the members of the room change the mentions
+        room_version = self.plugin.room_members.version(evt.room_id)
+        reply_key = (evt.room_id, room_version, groupname, membership_type, page_number, offset)
+        reply = self.replies.get(reply_key)
+        if reply is None:
+            try:
+                reply = await self._render_members_page(
+                    evt, groupname, membership_type, page_number, offset
+                )
+            except InfoGatherError as e:
+                await evt.respond(e.message)
+                return
+            self.replies.set(reply_key, reply)
+
+        message, cursor = reply
+        cursor_key = (evt.room_id, evt.sender)
+        if cursor is None:
+            self.cursors.pop(cursor_key)
+        else:
+            self.cursors.set(cursor_key, cursor)
+        await evt.respond(message)
+
+    async def _render_members_page(
+        self,
+        evt: MessageEvent,
+        groupname: str,
+        membership_type: str,
+        page_number: int,
+        offset: int,
+    ) -> tuple[str, tuple | None]:
+        """Return the message listing a page of the group, and the cursor of the next page"""
+        users: list[dict] = []
+        total: int | None = None
+        pages = self.plugin.fasjsonclient.iter_group_membership(
+            groupname,
+            membership_type=membership_type,
+            page_size=MEMBERS_PAGE_SIZE,
+            page=page_number,
+        )
+        async with contextlib.aclosing(pages):
+            # Only fetch the pages to display, FASJSON may return smaller pages than asked
+            async for page, page_total in pages:
+                users.extend(page)
+                total = page_total
+                page_number += 1
+                if len(users) >= MEMBERS_PAGE_SIZE:
+                    break
+
+        if total is None:
+            # The whole group was returned at once, it can't be listed page by page
+            if len(users) > MEMBERS_PAGE_SIZE:
+                return (
+                    f"{groupname} has {len(users)} {membership_type} "
+                    "and thats too many to dump here",
+                    None,
+                )
+            total = len(users)
 
         mentions = await self._get_mentions(users, evt)
-        await evt.respond(f"{membership_type.title()} of {groupname}: {', '.join(mentions)}")
+        if offset == 0 and len(users) >= total:
+            return f"{membership_type.title()} of {groupname}: {', '.join(mentions)}", None
+
+        end = offset + len(users)
+        message = (
+            f"{membership_type.title()} of {groupname} ({offset + 1} to {end} of {total}): "
+            f"{', '.join(mentions)}"
+        )
+        if end >= total:
+            return message, None
+        message += f"{NL}Say `!group more` for the next {membership_type}"
+        return message, (groupname, membership_type, page_number, end)
 
     @command.new(help="Query information about Fedora Accounts groups")
     async def group(self, evt: MessageEvent) -> None:
@@ -77,8 +159,23 @@ class FasHandler(Handler):
     async def group_sponsors(self, evt: MessageEvent, groupname: str) -> None:
         await self._list_members(evt, groupname, "sponsors")
 
+    @group.subcommand(
+        name="more", help="Return the next members or sponsors of the group listed last"
+    )
+    @with_deadline
+    async def group_more(self, evt: MessageEvent) -> None:
+        cursor = self.cursors.get((evt.room_id, evt.sender))
+        if cursor is None:
+            await evt.respond(
+                "There is nothing more to list, start with `!group members <groupname>`"
+            )
+            return
+        await evt.mark_read()
+        await self._send_members_page(evt, *cursor)
+
     @group.subcommand(name="info", help="Return a list of owners of the specified group")
     @command.argument("groupname", required=True)
+    @with_deadline
     async def group_info(self, evt: MessageEvent, groupname: str) -> None:
         if not groupname:
             await evt.respond("groupname argument is required. e.g. `!group info designteam`")
@@ -100,10 +197,13 @@ class FasHandler(Handler):
             f"**Chat:** {chat_channels}{NL}"
         )
 
+    @with_deadline
     async def _user_hello(self, evt: MessageEvent, username: str | None) -> None:
         await evt.mark_read()
         try:
-            user = await get_fasuser(username or evt.sender, evt, self.plugin.fasjsonclient)
+            user = await get_fasuser(
+                username or evt.sender, evt, self.plugin.fasjsonclient, fields=HELLO_FIELDS
+            )
         except InfoGatherError as e:
             await evt.respond(e.message)
             return
@@ -114,8 +214,9 @@ class FasHandler(Handler):
         message = f"{user['human_name']} ({user['username']})"
         if pronouns := user.get("pronouns"):
             message += " - " + " or ".join(pronouns)
-        await inline_reply(evt, message)
+        await inline_reply(evt, message, self.plugin.displaynames)
 
+    @with_deadline
     async def _user_info(self, evt: MessageEvent, username: str | None) -> None:
         await evt.mark_read()
         try:
@@ -134,10 +235,13 @@ class FasHandler(Handler):
             f"GPG Key IDs: {' and '.join(k for k in user['gpgkeyids'] or ['None'])}{NL}"
         )
 
+    @with_deadline
     async def _user_localtime(self, evt: MessageEvent, username: str | None) -> None:
         await evt.mark_read()
         try:
-            user = await get_fasuser(username or evt.sender, evt, self.plugin.fasjsonclient)
+            user = await get_fasuser(
+                username or evt.sender, evt, self.plugin.fasjsonclient, fields=LOCALTIME_FIELDS
+            )
         except InfoGatherError as e:
             await evt.respond(e.message)
             return
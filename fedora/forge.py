@@ -7,14 +7,17 @@ from maubot.handlers import command
 from .clients.forgejo import ForgejoClient
 from .constants import COMMAND_RE, NL
 from .exceptions import InfoGatherError
-from .handler import Handler
+from .handler import Handler, with_deadline
 
 
 class ForgeHandler(Handler):
     def __init__(self, plugin):
         super().__init__(plugin)
-        self.forgejoclient = ForgejoClient(self.plugin.config["forge_url"])
+        self.forgejoclient = ForgejoClient(
+            self.plugin.config["forge_url"], upstream=plugin.upstreams["forge"]
+        )
 
+    @with_deadline
     async def _get_forge_issue(self, evt: MessageEvent, org: str, repo: str, issue_id: str) -> None:
         await evt.mark_read()
         try:
@@ -58,6 +61,7 @@ class ForgeHandler(Handler):
             allow_html=True,
         )
 
+    @with_deadline
     async def _get_forge_pull_request(
         self, evt: MessageEvent, org: str, repo: str, pull_id: str
     ) -> None:
@@ -1,3 +1,19 @@
+import functools
+
+from .clients.deadline import deadline
+
+
 class Handler:
     def __init__(self, plugin):
         self.plugin = plugin
+
+
+def with_deadline(func):
+    """Give up on the upstream calls of a command once its command_timeout has passed"""
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        with deadline(self.plugin.config["command_timeout"]):
+            return await func(self, *args, **kwargs)
+
+    return wrapper
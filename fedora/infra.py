@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import logging
 
@@ -9,18 +10,25 @@ from .clients.fedorastatus import FedoraStatusClient
 from .constants import COMMAND_RE, NL
 from .db import UNIQUE_ERROR
 from .exceptions import InfoGatherError
-from .handler import Handler
-from .utils import get_fasuser, get_rowcount, matrix_ids_from_ircnicks
+from .handler import Handler, with_deadline
+from .mentions import matrix_ids_from_ircnicks
+from .utils import get_fasuser, get_rowcount
 
 log = logging.getLogger(__name__)
 
+# The fields of the users that are added to the oncall list
+ONCALL_FIELDS = ("ircnicks", "timezone")
+
 
 class InfraHandler(Handler):
     def __init__(self, plugin):
         super().__init__(plugin)
         self.fedorastatus_url = plugin.config["fedorastatus_url"]
-        self.fedorastatus = FedoraStatusClient(self.fedorastatus_url)
+        self.fedorastatus = FedoraStatusClient(
+            self.fedorastatus_url, upstream=plugin.upstreams["fedorastatus"]
+        )
 
+    @with_deadline
     async def _get_oncall(self, evt: MessageEvent) -> None:
         await evt.mark_read()
         dbq = """
@@ -76,6 +84,7 @@ class InfraHandler(Handler):
 
     @oncall.subcommand(name="add", help="Add a user to the current oncall list")
     @command.argument("username", pass_raw=True, required=True)
+    @with_deadline
     async def oncall_add(self, evt: MessageEvent, username: str) -> None:
         if evt.room_id != self.plugin.config["controlroom"]:
             await evt.reply(
@@ -84,7 +93,9 @@ class InfraHandler(Handler):
             return
         await evt.mark_read()
         try:
-            user = await get_fasuser(username or evt.sender, evt, self.plugin.fasjsonclient)
+            user = await get_fasuser(
+                username or evt.sender, evt, self.plugin.fasjsonclient, fields=ONCALL_FIELDS
+            )
         except InfoGatherError as e:
             await evt.respond(e.message)
             return
@@ -111,6 +122,7 @@ class InfraHandler(Handler):
 
     @oncall.subcommand(name="remove", help="Remove a user to the current oncall list")
     @command.argument("username", pass_raw=True, required=True)
+    @with_deadline
     async def oncall_remove(self, evt: MessageEvent, username: str) -> None:
         if evt.room_id != self.plugin.config["controlroom"]:
             await evt.reply(
@@ -119,7 +131,9 @@ class InfraHandler(Handler):
             return
         await evt.mark_read()
         try:
-            user = await get_fasuser(username or evt.sender, evt, self.plugin.fasjsonclient)
+            user = await get_fasuser(
+                username or evt.sender, evt, self.plugin.fasjsonclient, fields=()
+            )
         except InfoGatherError as e:
             await evt.respond(e.message)
             return
@@ -137,6 +151,7 @@ class InfraHandler(Handler):
             await evt.reply(f"Unexpected response trying to remove user: {result}")
 
     @infra.subcommand(name="status", help="get a list of the ongoing and planned outages")
+    @with_deadline
     async def infra_status(self, evt: MessageEvent) -> None:
         def format_title(outage):
             if outage.get("ticket"):
@@ -144,10 +159,15 @@ class InfraHandler(Handler):
             else:
                 return f"**{outage.get('title')}**"
 
-        ongoing = await self.fedorastatus.get_outages("ongoing")
+        try:
+            ongoing, planned = await asyncio.gather(
+                self.fedorastatus.get_outages("ongoing"),
+                self.fedorastatus.get_outages("planned"),
+            )
+        except InfoGatherError as e:
+            await evt.respond(e.message)
+            return
         ongoing = ongoing.get("outages", [])
-
-        planned = await self.fedorastatus.get_outages("planned")
         planned = planned.get("outages", [])
 
         message = f"I checked [Fedora Status]({self.fedorastatus_url}) and there are "
@@ -0,0 +1,38 @@
+import time
+
+
+class MatrixIdIndex:
+    """
+    The Fedora Accounts usernames that Matrix IDs were found to belong to
+
+    Stored in the database, so that looking up the same Matrix IDs never needs a search in
+    FASJSON again. A pair is stale once it is older than `refresh_interval` seconds: it is still
+    used, but should be checked again.
+    """
+
+    def __init__(self, database, refresh_interval=86400) -> None:
+        self.database = database
+        self.refresh_interval = refresh_interval
+
+    async def get(self, mxid: str) -> tuple[str, bool] | None:
+        """Return the username for the Matrix ID and whether it's stale, if it is known"""
+        row = await self.database.fetchrow(
+            "SELECT username, updated FROM matrix_ids WHERE mxid = $1", mxid
+        )
+        if row is None:
+            return None
+        return row["username"], time.time() - row["updated"] >= self.refresh_interval
+
+    async def set(self, mxid: str, username: str) -> None:
+        await self.database.execute(
+            """
+                INSERT INTO matrix_ids (mxid, username, updated) VALUES ($1, $2, $3)
+                ON CONFLICT (mxid) DO UPDATE SET username = $2, updated = $3
+            """,
+            mxid,
+            username,
+            int(time.time()),
+        )
+
+    async def remove(self, mxid: str) -> None:
+        await self.database.execute("DELETE FROM matrix_ids WHERE mxid = $1", mxid)
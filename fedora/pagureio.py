@@ -5,14 +5,17 @@ from maubot.handlers import command
 from .clients.pagure import PagureClient
 from .constants import COMMAND_RE, NL
 from .exceptions import InfoGatherError
-from .handler import Handler
+from .handler import Handler, with_deadline
 
 
 class PagureIOHandler(Handler):
     def __init__(self, plugin):
         super().__init__(plugin)
-        self.pagureioclient = PagureClient(self.plugin.config["pagureio_url"])
+        self.pagureioclient = PagureClient(
+            self.plugin.config["pagureio_url"], upstream=plugin.upstreams["pagureio"]
+        )
 
+    @with_deadline
     async def _get_pagure_issue(self, evt: MessageEvent, project: str, issue_id: str) -> None:
         await evt.mark_read()
         try:
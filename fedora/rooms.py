@@ -0,0 +1,79 @@
+from maubot.handlers import event
+from mautrix.types import EventType, Membership, MemberStateEventContent, StateEvent
+
+from .clients.singleflight import SingleFlight
+from .handler import Handler
+
+# How many display names to keep, by room and user, and for how long in seconds. They are
+# updated from the membership events, the TTL is only a safety net.
+MAX_DISPLAYNAMES = 4096
+DISPLAYNAME_TTL = 86400
+
+
+class RoomMembers:
+    """
+    The Matrix IDs of the users who joined each room
+
+    The members of a room are asked to the homeserver the first time they are needed, then kept
+    up to date from the membership events of the room. The version of a room changes with its
+    members, so that what was computed from them can be discarded.
+    """
+
+    def __init__(self) -> None:
+        self.rooms: dict[str, set[str]] = {}
+        self.versions: dict[str, int] = {}
+        self._singleflight = SingleFlight()
+
+    def version(self, room_id: str) -> int:
+        return self.versions.get(room_id, 0)
+
+    def _changed(self, room_id: str) -> None:
+        self.versions[room_id] = self.version(room_id) + 1
+
+    async def get(self, client, room_id: str) -> set[str]:
+        if room_id not in self.rooms:
+            await self._singleflight.do(room_id, lambda: self._load(client, room_id))
+        return self.rooms[room_id]
+
+    async def _load(self, client, room_id: str) -> None:
+        members = await client.get_joined_members(room_id)
+        self.rooms[room_id] = set(members.keys())
+
+    def update(self, room_id: str, mxid: str, membership: Membership) -> None:
+        members = self.rooms.get(room_id)
+        if members is None:
+            # Not loaded yet, the homeserver will have the change
+            return
+        joined = membership == Membership.JOIN
+        if joined == (mxid in members):
+            # A change of display name or avatar
+            return
+        if joined:
+            members.add(mxid)
+        else:
+            members.discard(mxid)
+        self._changed(room_id)
+
+    def forget(self, room_id: str) -> None:
+        self.rooms.pop(room_id, None)
+        self._changed(room_id)
+
+
+class RoomsHandler(Handler):
+    # The event.on() decorator is not correctly typed and doesn't understand
+    # this is a bound method.
+    @event.on(EventType.ROOM_MEMBER)  # type: ignore[arg-type]
+    async def handle_member(self, evt: StateEvent) -> None:
+        if not isinstance(evt.content, MemberStateEventContent):
+            return
+        membership = evt.content.membership
+        if evt.state_key == self.plugin.client.mxid and membership != Membership.JOIN:
+            # The bot left the room, it won't get its events anymore
+            self.plugin.room_members.forget(evt.room_id)
+            return
+        self.plugin.room_members.update(evt.room_id, evt.state_key, membership)
+        key = (evt.room_id, evt.state_key)
+        if membership == Membership.JOIN and evt.content.displayname:
+            self.plugin.displaynames.set(key, evt.content.displayname)
+        else:
+            self.plugin.displaynames.pop(key)
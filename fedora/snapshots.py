@@ -0,0 +1,83 @@
+import asyncio
+import contextlib
+import json
+import logging
+from collections.abc import Callable
+
+log = logging.getLogger(__name__)
+
+
+def _encode(entries: list) -> str:
+    return json.dumps(entries, separators=(",", ":"))
+
+
+class CacheSnapshots:
+    """
+    Save the in-memory caches to the database, so that the bot starts with them after a restart
+
+    The caches are saved every `interval` seconds and when the plugin stops, and loaded when it
+    starts. Each cache is added with a function that returns its entries in a form that can be
+    stored as JSON, and a function that adds those entries back. An interval of 0 disables the
+    snapshots.
+    """
+
+    def __init__(self, database, interval=300) -> None:
+        self.database = database
+        self.interval = interval
+        self.caches: dict[str, tuple[Callable[[], list], Callable[[list], None]]] = {}
+        self._task: asyncio.Task | None = None
+
+    def add(self, name: str, dump: Callable[[], list], load: Callable[[list], None]) -> None:
+        self.caches[name] = (dump, load)
+
+    async def save(self) -> None:
+        loop = asyncio.get_running_loop()
+        for name, (dump, _load) in self.caches.items():
+            try:
+                # Encoding a large cache would block the event loop
+                data = await loop.run_in_executor(None, _encode, dump())
+                await self.database.execute(
+                    """
+                        INSERT INTO cache_snapshots (name, data) VALUES ($1, $2)
+                        ON CONFLICT (name) DO UPDATE SET data = $2
+                    """,
+                    name,
+                    data,
+                )
+            except Exception:
+                # The bot will just start with an older snapshot, or none
+                log.exception(f"Could not save the snapshot of the {name} cache")
+
+    async def load(self) -> None:
+        if not self.interval:
+            return
+        rows = await self.database.fetch("SELECT name, data FROM cache_snapshots")
+        for row in rows:
+            if row["name"] not in self.caches:
+                continue
+            _dump, load = self.caches[row["name"]]
+            try:
+                load(json.loads(row["data"]))
+            except (ValueError, TypeError, KeyError) as e:
+                # The cache will just be filled again
+                log.warning(f"Could not load the snapshot of the {row['name']} cache: {e!r}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.save()
+
+    def start(self):
+        if not self.interval:
+            log.info("The cache snapshots are disabled")
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        await self.save()
@@ -0,0 +1,142 @@
+import asyncio
+import contextlib
+import json
+import logging
+import time
+
+from .mentions import matrix_ids_from_ircnicks
+
+log = logging.getLogger(__name__)
+
+# The fields of the users kept in the snapshot
+SNAPSHOT_FIELDS = (
+    "username",
+    "human_name",
+    "pronouns",
+    "timezone",
+    "locale",
+    "ircnicks",
+    "creation",
+)
+
+
+class UserSnapshot:
+    """
+    A copy of the Fedora Accounts users in the database, to look them up without FASJSON
+
+    The copy is synced with FASJSON every `interval` seconds, by listing every user: only the
+    users that changed are written, and the users that are gone are removed. It is not used
+    anymore once the last sync is older than `max_age` seconds. An interval of 0 disables it.
+    """
+
+    def __init__(self, database, interval=0, max_age=86400, page_size=500) -> None:
+        self.database = database
+        self.interval = interval
+        self.max_age = max_age
+        self.page_size = page_size
+        # When the last sync finished
+        self.synced = 0.0
+        self._task: asyncio.Task | None = None
+
+    @property
+    def usable(self) -> bool:
+        return bool(self.interval) and time.time() - self.synced < self.max_age
+
+    async def get(self, username: str) -> dict | None:
+        if not self.usable:
+            return None
+        row = await self.database.fetchrow(
+            "SELECT data FROM fas_users WHERE username = $1", username
+        )
+        return None if row is None else json.loads(row["data"])
+
+    async def get_by_matrix_id(self, mxid: str) -> list[dict]:
+        """Return the users who have the Matrix ID in their ircnicks"""
+        if not self.usable:
+            return []
+        rows = await self.database.fetch(
+            """
+                SELECT fas_users.data FROM fas_user_mxids
+                JOIN fas_users ON fas_users.username = fas_user_mxids.username
+                WHERE fas_user_mxids.mxid = $1
+            """,
+            mxid,
+        )
+        return [json.loads(row["data"]) for row in rows]
+
+    async def sync(self, fasjson) -> None:
+        # Only keep a hash of the stored users, to find the ones that changed
+        known = {
+            row["username"]: hash(row["data"])
+            for row in await self.database.fetch("SELECT username, data FROM fas_users")
+        }
+        seen = set()
+        changed = 0
+        pages = fasjson.iter_users(fields=SNAPSHOT_FIELDS, page_size=self.page_size)
+        async with contextlib.aclosing(pages):
+            async for page, _total in pages:
+                async with self.database.acquire() as conn, conn.transaction():
+                    for user in page:
+                        username = user["username"]
+                        seen.add(username)
+                        data = json.dumps(
+                            {field: user.get(field) for field in SNAPSHOT_FIELDS},
+                            separators=(",", ":"),
+                        )
+                        if known.get(username) == hash(data):
+                            continue
+                        await self._write(conn, username, data, user.get("ircnicks"))
+                        changed += 1
+
+        removed = [username for username in known if username not in seen]
+        async with self.database.acquire() as conn, conn.transaction():
+            for username in removed:
+                await conn.execute("DELETE FROM fas_users WHERE username = $1", username)
+                await conn.execute("DELETE FROM fas_user_mxids WHERE username = $1", username)
+            self.synced = time.time()
+            await conn.execute("DELETE FROM fas_users_sync")
+            await conn.execute("INSERT INTO fas_users_sync (synced) VALUES ($1)", int(self.synced))
+        log.info(f"Synced the Fedora Accounts users: {changed} changed, {len(removed)} removed")
+
+    async def _write(self, conn, username: str, data: str, ircnicks) -> None:
+        await conn.execute(
+            """
+                INSERT INTO fas_users (username, data) VALUES ($1, $2)
+                ON CONFLICT (username) DO UPDATE SET data = $2
+            """,
+            username,
+            data,
+        )
+        await conn.execute("DELETE FROM fas_user_mxids WHERE username = $1", username)
+        for mxid in set(matrix_ids_from_ircnicks(ircnicks)):
+            await conn.execute(
+                "INSERT INTO fas_user_mxids (mxid, username) VALUES ($1, $2)", mxid, username
+            )
+
+    async def _run(self, fasjson):
+        while True:
+            # Don't sync again right after a restart
+            await asyncio.sleep(max(0, self.synced + self.interval - time.time()))
+            try:
+                await self.sync(fasjson)
+            except Exception:
+                # Try again at the next interval, the users are looked up in FASJSON meanwhile
+                log.exception("Could not sync the Fedora Accounts users")
+                await asyncio.sleep(self.interval)
+
+    async def start(self, fasjson) -> None:
+        if not self.interval:
+            log.info("The snapshot of the Fedora Accounts users is disabled")
+            return
+        row = await self.database.fetchrow("SELECT synced FROM fas_users_sync")
+        if row is not None:
+            self.synced = float(row["synced"])
+        self._task = asyncio.create_task(self._run(fasjson))
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
@@ -5,9 +5,11 @@ from maubot import MessageEvent
 from mautrix.types import BaseMessageEventContent, MessageType, Obj, TextMessageEventContent
 from mautrix.util.async_db import Scheme
 
-from .clients.fasjson import FasjsonClient
+from .clients.cache import TTLCache
+from .clients.fasjson import USER_FIELDS, FasjsonClient
 from .constants import FAS_MATRIX_DOMAINS, MATRIX_USER_RE
 from .exceptions import InfoGatherError
+from .mentions import tag_user
 
 MENTION_RE = re.compile(r"href=['\"]?http[s]?://matrix.to/#/([^'\" >]+)['\" >]")
 
@@ -36,27 +38,27 @@ def get_matrix_id(username: str, evt: MessageEvent):
     return None
 
 
-async def get_fasuser_from_matrix_id(matrix_id: str, fasjson: FasjsonClient):
+async def get_fasuser_from_matrix_id(matrix_id: str, fasjson: FasjsonClient, fields=USER_FIELDS):
     try:
-        return await fasjson.get_users_by_matrix_id(matrix_id)
+        return await fasjson.get_users_by_matrix_id(matrix_id, fields=fields)
     except InfoGatherError:
         # Matrix ID not set in FAS, only use it if it's on fedora.im.
         matrix_user_match = MATRIX_USER_RE.match(matrix_id)
         # return await fasjson.get_user(matrix_user_match.group(1))
         if matrix_user_match is not None and matrix_user_match.group(2) in FAS_MATRIX_DOMAINS:
             username = matrix_user_match.group(1)
-            return await fasjson.get_user(username)
+            return await fasjson.get_user(username, fields=fields)
         else:
             raise
 
 
-async def get_fasuser(username: str, evt: MessageEvent, fasjson: FasjsonClient):
+async def get_fasuser(username: str, evt: MessageEvent, fasjson: FasjsonClient, fields=USER_FIELDS):
     matrix_id = get_matrix_id(username, evt)
     if matrix_id:
-        return await get_fasuser_from_matrix_id(matrix_id, fasjson)
+        return await get_fasuser_from_matrix_id(matrix_id, fasjson, fields=fields)
     # We haven't found a matrix ID.
     # Assume we were given a FAS / Fedora Account ID and use that
-    return await fasjson.get_user(username)
+    return await fasjson.get_user(username, fields=fields)
 
 
 def get_rowcount(db, result):
@@ -66,23 +68,6 @@ def get_rowcount(db, result):
         return result.rowcount
 
 
-def matrix_ids_from_ircnicks(ircnicks):
-    mxids = []
-    for nick in ircnicks or []:
-        if nick.startswith("matrix://"):
-            # should be "matrix://matrix.org/username"
-            m = nick.replace("matrix://", "").split("/")
-            # m should be ['matrix.org', "username"]
-            mxids.append(f"@{m[1]}:{m[0]}")
-        elif nick.startswith("matrix:/"):
-            mxids.append(f"{nick.replace('matrix:/', '@')}:fedora.im")
-    return mxids
-
-
-def tag_user(mxid, name=None):
-    return f"[{name or mxid}](https://matrix.to/#/{mxid})"
-
-
 def is_text_message(content: BaseMessageEventContent | Obj) -> TypeGuard[TextMessageEventContent]:
     """
     Check that a message's content is an instance of TextMessageEventContent
@@ -95,6 +80,11 @@ def is_text_message(content: BaseMessageEventContent | Obj) -> TypeGuard[TextMes
     )
 
 
-async def inline_reply(evt: MessageEvent, message: str):
-    displayname = await evt.client.get_displayname(evt.sender)
+async def inline_reply(evt: MessageEvent, message: str, displaynames: TTLCache | None = None):
+    key = (evt.room_id, evt.sender)
+    displayname = displaynames.get(key) if displaynames is not None else None
+    if displayname is None:
+        displayname = await evt.client.get_displayname(evt.sender)
+        if displaynames is not None and displayname:
+            displaynames.set(key, displayname)
     await evt.respond(f"{tag_user(evt.sender,name=displayname)}: {message}")
@@ -8,9 +8,12 @@ from mautrix.api import HTTPAPI
 from mautrix.types import (
     EventContent,
     EventType,
+    Membership,
+    MemberStateEventContent,
     MessageEvent,
     MessageType,
     RoomID,
+    StateEvent,
     TextMessageEventContent,
 )
 
@@ -64,3 +67,17 @@ def make_message(
         timestamp=int(time.time()),
         content=TextMessageEventContent(msgtype=msg_type, body=content, formatted_body=html),
     )
+
+
+def make_member_event(
+    mxid, membership=Membership.JOIN, displayname=None, room_id="testroom", sender=None
+):
+    return StateEvent(
+        type=EventType.ROOM_MEMBER,
+        room_id=room_id,
+        event_id="test",
+        sender=sender or mxid,
+        timestamp=int(time.time()),
+        state_key=mxid,
+        content=MemberStateEventContent(membership=membership, displayname=displayname),
+    )
@@ -0,0 +1,14 @@
+from unittest import mock
+
+import pytest
+
+from fedora.clients import breaker, cache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # Only the clock of the caches and breakers is frozen, asyncio keeps its own
+    now = mock.Mock(return_value=1000.0)
+    monkeypatch.setattr(cache, "monotonic", now)
+    monkeypatch.setattr(breaker, "monotonic", now)
+    return now
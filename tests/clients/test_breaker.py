@@ -0,0 +1,156 @@
+import asyncio
+import logging
+from unittest import mock
+
+import httpx
+import pytest
+
+from fedora.clients.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from fedora.clients.pagure import PagureClient
+from fedora.clients.upstream import Upstream
+from fedora.exceptions import InfoGatherError
+
+REJECTED = "Sorry, pagureio is not responding at the moment, please try again later"
+
+
+def ok():
+    return mock.AsyncMock(return_value=httpx.Response(200))
+
+
+def failing():
+    return mock.AsyncMock(side_effect=httpx.ConnectTimeout("timed out"))
+
+
+async def _fail(breaker, times):
+    for _ in range(times):
+        with pytest.raises(httpx.ConnectTimeout):
+            await breaker.call(failing())
+
+
+async def test_opens_after_threshold(clock, caplog):
+    breaker = CircuitBreaker("pagureio", threshold=3)
+    await _fail(breaker, 2)
+    assert breaker.state == CLOSED
+    await _fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.trips == 1
+    assert "Circuit breaker for pagureio is now open (consecutive failures: 3" in caplog.text
+
+    func = ok()
+    with pytest.raises(InfoGatherError, match=REJECTED):
+        await breaker.call(func)
+    func.assert_not_called()
+    assert breaker.rejected == 1
+
+
+async def test_success_resets_failures(clock):
+    breaker = CircuitBreaker("pagureio", threshold=3)
+    await _fail(breaker, 2)
+    await breaker.call(ok())
+    await _fail(breaker, 2)
+    assert breaker.state == CLOSED
+    assert breaker.failures == 2
+
+
+@pytest.mark.parametrize("status_code,failure", [(500, True), (503, True), (404, False)])
+async def test_server_errors_are_failures(clock, status_code, failure):
+    breaker = CircuitBreaker("pagureio", threshold=1)
+    response = await breaker.call(mock.AsyncMock(return_value=httpx.Response(status_code)))
+    assert response.status_code == status_code
+    assert (breaker.state == OPEN) is failure
+
+
+async def test_half_open_probe_success(clock, caplog):
+    caplog.set_level(logging.INFO)
+    breaker = CircuitBreaker("pagureio", threshold=1, recovery_timeout=30)
+    await _fail(breaker, 1)
+    clock.return_value += 29
+    with pytest.raises(InfoGatherError):
+        await breaker.call(ok())
+    clock.return_value += 1
+
+    probe_started = asyncio.Event()
+    probe_done = asyncio.Event()
+
+    async def _probe():
+        probe_started.set()
+        await probe_done.wait()
+        return httpx.Response(200)
+
+    probe = asyncio.create_task(breaker.call(_probe))
+    await probe_started.wait()
+    assert breaker.state == HALF_OPEN
+    # Only one request probes the upstream
+    with pytest.raises(InfoGatherError):
+        await breaker.call(ok())
+    probe_done.set()
+    await probe
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    assert "Circuit breaker for pagureio is now closed" in caplog.text
+    await breaker.call(ok())
+
+
+async def test_half_open_probe_failure(clock):
+    breaker = CircuitBreaker("pagureio", threshold=3, recovery_timeout=30)
+    await _fail(breaker, 3)
+    clock.return_value += 30
+    await _fail(breaker, 1)
+    assert breaker.state == OPEN
+    assert breaker.trips == 2
+    assert breaker.opened_at == clock.return_value
+
+
+async def test_half_open_probe_cancelled(clock):
+    breaker = CircuitBreaker("pagureio", threshold=1, recovery_timeout=30)
+    await _fail(breaker, 1)
+    clock.return_value += 30
+
+    async def _hang():
+        await asyncio.sleep(10)
+
+    probe = asyncio.create_task(breaker.call(_hang))
+    await asyncio.sleep(0)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert breaker.state == HALF_OPEN
+    # Another request can probe
+    await breaker.call(ok())
+    assert breaker.state == CLOSED
+
+
+async def test_disabled(clock):
+    breaker = CircuitBreaker("pagureio", threshold=0)
+    await _fail(breaker, 10)
+    assert breaker.state == CLOSED
+    await breaker.call(ok())
+
+
+async def test_client_fails_fast(respx_mock, clock, caplog):
+    client = PagureClient(
+        "http://pagure.example.com",
+        upstream=Upstream("pagureio", {"breaker_threshold": 2, "breaker_recovery_timeout": 60}),
+    )
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(
+        side_effect=httpx.ReadTimeout("timed out")
+    )
+    # The circuit opens while the request is retried, and the last retry is rejected
+    with caplog.at_level(logging.INFO), pytest.raises(InfoGatherError, match=REJECTED):
+        await client.get_issue("biscuits", "1")
+    assert route.call_count == 2
+    with pytest.raises(InfoGatherError, match=REJECTED):
+        await client.get_issue("biscuits", "1")
+    assert route.call_count == 2
+
+    clock.return_value += 60
+    route.mock(return_value=httpx.Response(200, json={"title": "biscuits"}))
+    assert await client.get_issue("biscuits", "1") == {"title": "biscuits"}
+    assert client.upstream.breaker.state == CLOSED
+
+
+def test_upstream_breaker_settings():
+    upstream = Upstream("pagureio", {"breaker_threshold": 7, "breaker_recovery_timeout": 12})
+    assert upstream.breaker.name == "pagureio"
+    assert upstream.breaker.threshold == 7
+    assert upstream.breaker.recovery_timeout == 12
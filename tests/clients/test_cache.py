@@ -0,0 +1,476 @@
+import asyncio
+import json
+from unittest import mock
+
+import httpx
+import pytest
+
+from fedora.clients import cache as cache_module
+from fedora.clients.bodhi import BodhiClient
+from fedora.clients.cache import DEFAULT_MAX_STALE, DEFAULT_TTLS, ResponseCache, TTLCache
+from fedora.clients.fasjson import FasjsonClient
+from fedora.clients.upstream import Upstream, Upstreams
+from fedora.exceptions import InfoGatherError
+
+
+def make_response(content=b"biscuits", status_code=200):
+    return httpx.Response(
+        status_code, content=content, request=httpx.Request("GET", "http://example.com")
+    )
+
+
+def test_ttls():
+    cache = ResponseCache(ttls={"user": 10, "cookie": 5})
+    assert cache.ttl("user") == 10
+    assert cache.ttl("cookie") == 5
+    assert cache.ttl("group") == DEFAULT_TTLS["group"]
+    assert cache.ttl("unknown") == 0
+    assert cache.ttl(None) == 0
+
+
+def test_get_set(clock):
+    cache = ResponseCache()
+    response = make_response()
+    assert cache.get("key") is None
+    cache.set("key", response, 60)
+    assert cache.get("key") is response
+    assert len(cache) == 1
+    assert cache.size == len(b"biscuits")
+
+
+def test_expiry(clock):
+    cache = ResponseCache()
+    cache.set("key", make_response(), 60)
+    clock.return_value = 1059.0
+    assert cache.get("key") is not None
+    clock.return_value = 1060.0
+    assert cache.get("key") is None
+    assert len(cache) == 0
+    assert cache.size == 0
+
+
+def test_replace(clock):
+    cache = ResponseCache()
+    cache.set("key", make_response(b"a" * 10), 60)
+    new = make_response(b"b" * 5)
+    cache.set("key", new, 60)
+    assert cache.get("key") is new
+    assert len(cache) == 1
+    assert cache.size == 5
+
+
+def test_lru_eviction_entries(clock):
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", make_response(), 60)
+    cache.set("b", make_response(), 60)
+    # "a" is now the most recently used
+    cache.get("a")
+    cache.set("c", make_response(), 60)
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_lru_eviction_bytes(clock):
+    cache = ResponseCache(max_bytes=25)
+    cache.set("a", make_response(b"a" * 10), 60)
+    cache.set("b", make_response(b"b" * 10), 60)
+    cache.set("c", make_response(b"c" * 10), 60)
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+    assert cache.size == 20
+
+
+def test_too_big(clock):
+    cache = ResponseCache(max_bytes=5)
+    cache.set("a", make_response(b"a" * 10), 60)
+    assert cache.get("a") is None
+    assert cache.size == 0
+
+
+async def test_client_cached(respx_mock, clock):
+    client = FasjsonClient(
+        "http://fasjson.example.com", upstream=Upstream("fasjson", cache=ResponseCache())
+    )
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        return_value=httpx.Response(200, json={"result": {"username": "dummy"}})
+    )
+    assert await client.get_user("dummy") == {"username": "dummy"}
+    assert await client.get_user("dummy") == {"username": "dummy"}
+    assert route.call_count == 1
+    # Expired
+    clock.return_value += DEFAULT_TTLS["user"]
+    assert await client.get_user("dummy") == {"username": "dummy"}
+    assert route.call_count == 2
+
+
+async def test_client_errors_not_cached(respx_mock, clock):
+    client = BodhiClient(
+        "http://bodhi.example.com", upstream=Upstream("bodhi", cache=ResponseCache())
+    )
+    route = respx_mock.get("http://bodhi.example.com/releases/").mock(
+        return_value=httpx.Response(500)
+    )
+    for _ in range(2):
+        with pytest.raises(InfoGatherError):
+            await client.get_current_release()
+    assert route.call_count == 2
+
+
+async def test_client_without_cache(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        return_value=httpx.Response(200, json={"result": {"username": "dummy"}})
+    )
+    await client.get_user("dummy")
+    await client.get_user("dummy")
+    assert route.call_count == 2
+
+
+def test_upstreams_share_cache():
+    cache = ResponseCache()
+    upstreams = Upstreams(cache=cache)
+    assert upstreams["fasjson"].cache is cache
+    assert upstreams["bodhi"].cache is cache
+
+
+async def test_plugin_cache(plugin):
+    assert plugin.upstreams["fasjson"].cache is plugin.cache
+    assert plugin.cache.ttl("user") == 300
+    # Overridden in the tests config
+    assert plugin.cache.ttl("issue") == 0
+
+
+@pytest.mark.parametrize(
+    "headers,expected",
+    [
+        ({}, {}),
+        ({"ETag": '"abc"'}, {"If-None-Match": '"abc"'}),
+        (
+            {"ETag": 'W/"abc"', "Last-Modified": "Wed, 21 Oct 2026 07:28:00 GMT"},
+            {"If-None-Match": 'W/"abc"', "If-Modified-Since": "Wed, 21 Oct 2026 07:28:00 GMT"},
+        ),
+    ],
+)
+def test_validators(clock, headers, expected):
+    cache = ResponseCache()
+    cache.set("key", httpx.Response(200, content=b"biscuits", headers=headers), 60)
+    assert cache.lookup("key").validators == expected
+
+
+def test_expired_kept_for_revalidation(clock):
+    cache = ResponseCache()
+    response = httpx.Response(200, content=b"biscuits", headers={"ETag": '"abc"'})
+    cache.set("key", response, 60)
+    clock.return_value += 60
+    # Not fresh, but still there to be revalidated
+    assert cache.get("key") is None
+    entry = cache.lookup("key")
+    assert entry.expired
+    assert entry.response is response
+    assert len(cache) == 1
+
+
+def _revalidating_server(etag, content):
+    def _respond(request):
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, content=content, headers={"ETag": etag})
+
+    return _respond
+
+
+async def test_client_revalidated(respx_mock, clock):
+    client = FasjsonClient(
+        "http://fasjson.example.com", upstream=Upstream("fasjson", cache=ResponseCache())
+    )
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/biscuits/members/").mock(
+        side_effect=_revalidating_server('"v1"', b'{"result": [{"username": "dummy"}]}')
+    )
+    assert await client.get_group_membership("biscuits") == [{"username": "dummy"}]
+    assert "If-None-Match" not in route.calls.last.request.headers
+    clock.return_value += DEFAULT_TTLS["group_membership"]
+
+    # Expired: revalidated with the upstream, which has no new content
+    assert await client.get_group_membership("biscuits") == [{"username": "dummy"}]
+    assert route.call_count == 2
+    assert route.calls.last.request.headers["If-None-Match"] == '"v1"'
+    assert route.calls.last.request.headers["X-Fields"] == "username,human_name,ircnicks"
+    assert route.calls.last.response.status_code == 304
+
+    # The 304 extended the life of the cached response
+    clock.return_value += DEFAULT_TTLS["group_membership"] - 1
+    assert await client.get_group_membership("biscuits") == [{"username": "dummy"}]
+    assert route.call_count == 2
+
+
+async def test_client_revalidated_changed(respx_mock, clock):
+    client = FasjsonClient(
+        "http://fasjson.example.com", upstream=Upstream("fasjson", cache=ResponseCache())
+    )
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        side_effect=_revalidating_server('"v1"', b'{"result": {"username": "dummy"}}')
+    )
+    await client.get_user("dummy")
+    clock.return_value += DEFAULT_TTLS["user"]
+    route.mock(side_effect=_revalidating_server('"v2"', b'{"result": {"username": "new"}}'))
+    assert await client.get_user("dummy") == {"username": "new"}
+    assert route.calls.last.request.headers["If-None-Match"] == '"v1"'
+    assert route.calls.last.response.status_code == 200
+    assert await client.get_user("dummy") == {"username": "new"}
+    assert route.call_count == 2
+
+
+def test_max_stale():
+    cache = ResponseCache(max_stale={"outages": 10, "cookie": 5})
+    assert cache.max_stale("outages") == 10
+    assert cache.max_stale("cookie") == 5
+    assert cache.max_stale("release") == DEFAULT_MAX_STALE["release"]
+    assert cache.max_stale("user") == 0
+
+
+def test_stale_entry(clock):
+    cache = ResponseCache()
+    response = make_response()
+    cache.set("key", response, 60, max_stale=30)
+    assert not cache.lookup("key").stale
+    clock.return_value += 60
+    entry = cache.lookup("key")
+    assert entry.expired and entry.stale
+    assert entry.response is response
+    assert cache.get("key") is None
+    # Past the hard limit
+    clock.return_value += 30
+    assert cache.lookup("key") is None
+    assert len(cache) == 0
+
+
+def _release(version):
+    return {"releases": [{"version": version, "id_prefix": "FEDORA", "eol": "2030-01-01"}]}
+
+
+@pytest.fixture
+def bodhi():
+    return BodhiClient(
+        "http://bodhi.example.com", upstream=Upstream("bodhi", cache=ResponseCache())
+    )
+
+
+async def test_stale_while_revalidate(respx_mock, clock, bodhi):
+    route = respx_mock.get("http://bodhi.example.com/releases/").mock(
+        return_value=httpx.Response(200, json=_release("41"))
+    )
+    assert (await bodhi.get_current_release())["version"] == "41"
+    clock.return_value += DEFAULT_TTLS["release"]
+
+    route.mock(return_value=httpx.Response(200, json=_release("42")))
+    # Served stale right away, several times, while one refresh runs
+    results = await asyncio.gather(*[bodhi.get_current_release() for _ in range(5)])
+    assert [r["version"] for r in results] == ["41"] * 5
+    assert len(bodhi.upstream._background_tasks) == 5
+    await asyncio.gather(*bodhi.upstream._background_tasks)
+    assert route.call_count == 2
+
+    # The next caller gets the refreshed response
+    assert (await bodhi.get_current_release())["version"] == "42"
+    assert route.call_count == 2
+
+
+async def test_stale_refresh_error_status(respx_mock, clock, bodhi, caplog):
+    route = respx_mock.get("http://bodhi.example.com/releases/").mock(
+        return_value=httpx.Response(200, json=_release("41"))
+    )
+    await bodhi.get_current_release()
+    clock.return_value += DEFAULT_TTLS["release"]
+    route.mock(return_value=httpx.Response(503))
+    assert (await bodhi.get_current_release())["version"] == "41"
+    await asyncio.gather(*bodhi.upstream._background_tasks)
+    assert "Could not refresh http://bodhi.example.com/releases/?state=current: 503" in caplog.text
+    # The stale response is still served
+    assert (await bodhi.get_current_release())["version"] == "41"
+
+
+async def test_stale_refresh_exception(respx_mock, clock, bodhi, caplog):
+    route = respx_mock.get("http://bodhi.example.com/releases/").mock(
+        return_value=httpx.Response(200, json=_release("41"))
+    )
+    await bodhi.get_current_release()
+    clock.return_value += DEFAULT_TTLS["release"]
+    route.mock(side_effect=httpx.ConnectError("Connection refused"))
+    assert (await bodhi.get_current_release())["version"] == "41"
+    await asyncio.gather(*bodhi.upstream._background_tasks, return_exceptions=True)
+    assert "Background request to bodhi failed: ConnectError('Connection refused')" in caplog.text
+    assert (await bodhi.get_current_release())["version"] == "41"
+
+
+async def test_too_stale(respx_mock, clock, bodhi):
+    route = respx_mock.get("http://bodhi.example.com/releases/").mock(
+        return_value=httpx.Response(200, json=_release("41"))
+    )
+    await bodhi.get_current_release()
+    clock.return_value += DEFAULT_TTLS["release"] + DEFAULT_MAX_STALE["release"]
+    route.mock(return_value=httpx.Response(200, json=_release("42")))
+    assert (await bodhi.get_current_release())["version"] == "42"
+    assert bodhi.upstream._background_tasks == set()
+
+
+async def test_background_tasks_cancelled_on_close():
+    upstream = Upstream("bodhi")
+    upstream.run_in_background(asyncio.sleep(10))
+    task = next(iter(upstream._background_tasks))
+    await upstream.aclose()
+    await asyncio.gather(task, return_exceptions=True)
+    assert task.cancelled()
+    assert upstream._background_tasks == set()
+
+
+def test_ttl_cache(clock):
+    cache = TTLCache(max_entries=2, ttl=10)
+    assert cache.get("dummy") is None
+    assert "dummy" not in cache
+    cache.set("dummy", {"username": "dummy"})
+    assert cache.get("dummy") == {"username": "dummy"}
+    assert "dummy" in cache
+    clock.return_value += 10
+    assert cache.get("dummy", "missing") == "missing"
+    assert len(cache) == 0
+
+
+def test_ttl_cache_custom_ttl(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("dummy", 1, ttl=60)
+    clock.return_value += 30
+    assert cache.get("dummy") == 1
+
+
+def test_ttl_cache_lru(clock):
+    cache = TTLCache(max_entries=2, ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    # Replacing a value doesn't evict anything
+    cache.set("c", 4)
+    assert len(cache) == 2
+    assert cache.get("c") == 4
+
+
+def test_ttl_cache_invalidation(clock):
+    cache = TTLCache(ttl=10)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.pop("a") == 1
+    assert cache.pop("a", "missing") == "missing"
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_ttl_cache_disabled(clock):
+    cache = TTLCache(ttl=0)
+    cache.set("a", 1)
+    assert "a" not in cache
+
+
+def test_response_cache_dump_load(clock, monkeypatch):
+    wall = mock.Mock(return_value=5000.0)
+    monkeypatch.setattr(cache_module, "time", wall)
+    cache = ResponseCache()
+    response = httpx.Response(
+        200,
+        json={"result": "biscuits"},
+        headers={"ETag": '"abc"', "Content-Encoding": "identity"},
+        request=httpx.Request("GET", "http://example.com/biscuits"),
+    )
+    cache.set(("http://example.com/biscuits", (("X-Fields", "name"),)), response, 60)
+    cache.set(("http://example.com/expired", ()), make_response(), 10, max_stale=10)
+    clock.return_value = 1030.0
+    wall.return_value = 5030.0
+    entries = cache.dump()
+    assert len(entries) == 1
+    # The entries survive a restart, with the same expiry time
+    clock.return_value = 10.0
+    wall.return_value = 5040.0
+    restored = ResponseCache()
+    restored.load(json.loads(json.dumps(entries)))
+    entry = restored.lookup(("http://example.com/biscuits", (("X-Fields", "name"),)))
+    assert entry.response.json() == {"result": "biscuits"}
+    assert entry.response.url == "http://example.com/biscuits"
+    assert entry.validators == {"If-None-Match": '"abc"'}
+    assert entry.expires == 30.0
+    assert restored.size == len(response.content)
+    # Expired entries that can't be revalidated are not loaded
+    clock.return_value = 100.0
+    wall.return_value = 6000.0
+    entries[0]["headers"] = []
+    restored = ResponseCache()
+    restored.load(entries)
+    assert len(restored) == 0
+
+
+def test_response_cache_load_too_large(clock, monkeypatch):
+    cache = ResponseCache()
+    cache.set(("http://example.com", ()), make_response(), 60)
+    restored = ResponseCache(max_bytes=2)
+    restored.load(cache.dump())
+    assert len(restored) == 0
+
+
+def test_response_cache_dump_limits(clock):
+    cache = ResponseCache()
+    cache.set(("http://example.com/a", ()), make_response(b"a" * 10), 60)
+    cache.set(("http://example.com/b", ()), make_response(b"b" * 10), 60)
+    cache.set(("http://example.com/large", ()), make_response(b"c" * 100), 60)
+    cache.set(("http://example.com/d", ()), make_response(b"d" * 10), 60)
+    # The large response is left out, then the least recently used ones
+    entries = cache.dump(max_entry_size=50, max_size=25)
+    assert [entry["key"][0] for entry in entries] == [
+        "http://example.com/b",
+        "http://example.com/d",
+    ]
+    restored = ResponseCache()
+    restored.load(entries)
+    assert list(restored._entries) == [("http://example.com/b", ()), ("http://example.com/d", ())]
+
+
+def test_ttl_cache_dump_load(clock, monkeypatch):
+    wall = mock.Mock(return_value=5000.0)
+    monkeypatch.setattr(cache_module, "time", wall)
+    cache = TTLCache(ttl=60)
+    cache.set(("user", "dummy"), True)
+    cache.set("short", 1, ttl=10)
+    cache.set("long", {"a": 1}, ttl=600)
+    clock.return_value = 1020.0
+    wall.return_value = 5020.0
+    entries = json.loads(json.dumps(cache.dump(encode=lambda value: [value])))
+    assert len(entries) == 2
+    clock.return_value = 10.0
+    wall.return_value = 5030.0
+    restored = TTLCache(ttl=60)
+    restored.load(entries, decode=lambda value: value[0])
+    assert restored.get(("user", "dummy")) is True
+    # The TTL of the cache is the limit
+    assert restored.get("long") == {"a": 1}
+    clock.return_value = 40.0
+    assert ("user", "dummy") not in restored
+    assert "long" in restored
+    clock.return_value = 70.0
+    assert "long" not in restored
+
+
+def test_ttl_cache_load_disabled(clock):
+    cache = TTLCache(ttl=60)
+    cache.set("a", 1)
+    restored = TTLCache(ttl=0)
+    restored.load(cache.dump())
+    assert len(restored) == 0
+
+
+async def test_plugin_user_cache(plugin):
+    assert plugin.fasjsonclient.users is plugin.user_cache
+    assert plugin.user_cache.ttl == 300
+    assert plugin.fasjsonclient.missing is plugin.missing_cache
+    assert plugin.missing_cache.ttl == 60
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+import pytest
+
+from fedora.clients.deadline import deadline, remaining
+from fedora.clients.pagure import PagureClient
+from fedora.clients.upstream import Upstream
+from fedora.exceptions import InfoGatherError
+
+
+def test_no_deadline():
+    assert remaining() is None
+    with deadline(0):
+        assert remaining() is None
+
+
+def test_deadline():
+    with deadline(10):
+        assert 9 < remaining() <= 10
+        # Nested deadlines can only be shorter
+        with deadline(20):
+            assert remaining() <= 10
+        with deadline(5):
+            assert remaining() <= 5
+        with deadline(0):
+            assert 5 < remaining() <= 10
+        assert 5 < remaining() <= 10
+    assert remaining() is None
+
+
+async def test_expired_deadline():
+    with deadline(0.01):
+        await asyncio.sleep(0.02)
+        assert remaining() == 0
+
+
+async def test_client_gives_up(respx_mock):
+    client = PagureClient("http://pagure.example.com", upstream=Upstream("pagureio"))
+    answered = asyncio.Event()
+
+    async def _slow(request):
+        await asyncio.sleep(0.05)
+        answered.set()
+        return httpx.Response(200, json={"title": "biscuits"})
+
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(
+        side_effect=_slow
+    )
+    with deadline(0.01), pytest.raises(
+        InfoGatherError, match="Sorry, pagureio took too long to answer, please try again later"
+    ):
+        await client.get_issue("biscuits", "1")
+    # The request was not cancelled
+    await answered.wait()
+    assert route.call_count == 1
+    with deadline(1):
+        assert await client.get_issue("biscuits", "1") == {"title": "biscuits"}
+
+
+def test_upstream_timeouts():
+    upstream = Upstream("pagureio", {"connect_timeout": 2, "read_timeout": 7})
+    timeout = upstream.http.timeout
+    assert timeout.connect == 2
+    assert timeout.read == 7
+    assert timeout.pool == 7
@@ -1,11 +1,14 @@
+import asyncio
 import re
 from unittest import mock
 
 import httpx
 import pytest
 
-from fedora.clients.fasjson import FasjsonClient
+from fedora.clients.cache import TTLCache
+from fedora.clients.fasjson import USER_FIELDS, CachedUser, FasjsonClient
 from fedora.exceptions import InfoGatherError
+from fedora.matrixids import MatrixIdIndex
 
 
 @pytest.mark.parametrize(
@@ -28,7 +31,10 @@ async def test_get_group_membership(monkeypatch, groupname, membership_type, exp
 
     response = await client.get_group_membership(groupname, membership_type)
     mock__get.assert_called_once_with(
-        expected_url, params=None, headers={"X-Fields": "username,human_name,ircnicks"}
+        expected_url,
+        params=None,
+        headers={"X-Fields": "username,human_name,ircnicks"},
+        cache="group_membership",
     )
     assert response == result
 
@@ -73,7 +79,7 @@ async def test_get_group(monkeypatch, groupname, expected_url):
     monkeypatch.setattr(client, "_get", mock__get)
 
     response = await client.get_group(groupname)
-    mock__get.assert_called_once_with(expected_url, params=None)
+    mock__get.assert_called_once_with(expected_url, params=None, cache="group")
     assert response == result
 
 
@@ -116,7 +122,14 @@ async def test_get_user(monkeypatch, username, expected_url):
     monkeypatch.setattr(client, "_get", mock__get)
 
     response = await client.get_user(username)
-    mock__get.assert_called_once_with(expected_url, params=None)
+    mock__get.assert_called_once_with(
+        expected_url,
+        params=None,
+        headers={
+            "X-Fields": "creation,gpgkeyids,human_name,ircnicks,locale,pronouns,timezone,username"
+        },
+        cache="user",
+    )
     assert response == result
 
 
@@ -172,3 +185,435 @@ async def test_get_users_by_matrix_id_multiple_users(monkeypatch):
         ),
     ):
         await client.get_users_by_matrix_id("@cookie:biscuit.test")
+
+
+async def test_get_user_cached(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "result": {
+                    "username": "dummy",
+                    "human_name": "Dummy User",
+                    "timezone": "UTC",
+                    "emails": ["dummy@example.com"],
+                    "certificates": None,
+                }
+            },
+        )
+    )
+    expected = {"username": "dummy", "human_name": "Dummy User", "timezone": "UTC"}
+    # Only the displayed fields are kept
+    assert await client.get_user("dummy") == expected
+    assert await client.get_user("dummy") == expected
+    assert route.call_count == 1
+    assert client.users.get("dummy").user == expected
+    assert client.users.get("dummy").fields == {*USER_FIELDS}
+
+
+async def test_get_user_with_params_not_cached(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        return_value=httpx.Response(200, json={"result": {"username": "dummy", "emails": []}})
+    )
+    params = {"with_groups": "true"}
+    assert await client.get_user("dummy", params=params) == {"username": "dummy", "emails": []}
+    assert len(client.users) == 0
+    await client.get_user("dummy", params=params)
+    assert route.call_count == 2
+
+
+async def test_get_user_fields(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        side_effect=lambda request: httpx.Response(
+            200,
+            json={
+                "result": {
+                    field: field
+                    for field in request.headers["X-Fields"].split(",")
+                    if field != "username"
+                }
+                | {"username": "dummy"}
+            },
+        )
+    )
+    assert await client.get_user("dummy", fields=["timezone"]) == {
+        "username": "dummy",
+        "timezone": "timezone",
+    }
+    assert route.calls.last.request.headers["X-Fields"] == "timezone,username"
+    # Asking for more fields gets the cached ones too
+    assert await client.get_user("dummy", fields=["human_name"]) == {
+        "username": "dummy",
+        "human_name": "human_name",
+        "timezone": "timezone",
+    }
+    assert route.calls.last.request.headers["X-Fields"] == "human_name,timezone,username"
+    # Fewer fields are served from the cache
+    assert await client.get_user("dummy", fields=["timezone"]) == {
+        "username": "dummy",
+        "human_name": "human_name",
+        "timezone": "timezone",
+    }
+    assert await client.get_user("dummy", fields=()) == {
+        "username": "dummy",
+        "human_name": "human_name",
+        "timezone": "timezone",
+    }
+    assert route.call_count == 2
+
+
+async def test_get_user_all_fields(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        return_value=httpx.Response(200, json={"result": {"username": "dummy", "emails": []}})
+    )
+    assert await client.get_user("dummy", fields=None) == {"username": "dummy", "emails": []}
+    assert "X-Fields" not in route.calls.last.request.headers
+    assert len(client.users) == 0
+
+
+async def test_search_users_fields(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = respx_mock.get("http://fasjson.example.com/v1/search/users/").mock(
+        return_value=httpx.Response(200, json={"result": [{"username": "dummy"}]})
+    )
+    assert await client.search_users(fields=["ircnicks"]) == [{"username": "dummy"}]
+    assert route.calls.last.request.headers["X-Fields"] == "ircnicks,username"
+    await client.search_users(fields=None)
+    assert "X-Fields" not in route.calls.last.request.headers
+
+
+async def test_get_users_by_matrix_id_cached(monkeypatch):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    monkeypatch.setattr(
+        client,
+        "search_users",
+        mock.AsyncMock(return_value=[{"username": "dummy", "ircnicks": ["matrix://x.test/d"]}]),
+    )
+    user = await client.get_users_by_matrix_id("@d:x.test")
+    assert user == {"username": "dummy", "ircnicks": ["matrix://x.test/d"]}
+    # The user can then be looked up by username without a request
+    monkeypatch.setattr(client, "_get", mock.AsyncMock())
+    assert await client.get_user("dummy") == user
+    client._get.assert_not_called()
+
+
+async def test_get_users_by_matrix_id_without_cache(monkeypatch):
+    client = FasjsonClient("http://fasjson.example.com")
+    found = {"username": "dummy", "emails": ["dummy@example.com"]}
+    monkeypatch.setattr(client, "search_users", mock.AsyncMock(return_value=[found]))
+    assert await client.get_users_by_matrix_id("@d:x.test") == {"username": "dummy"}
+
+
+@pytest.fixture
+def indexed_client(db):
+    return FasjsonClient(
+        "http://fasjson.example.com", matrix_ids=MatrixIdIndex(db, refresh_interval=3600)
+    )
+
+
+def _mock_search(respx_mock, *usernames):
+    return respx_mock.get(
+        "http://fasjson.example.com/v1/search/users/",
+        params={"ircnick__exact": "matrix://example.com/dummy"},
+    ).mock(
+        return_value=httpx.Response(
+            200, json={"result": [{"username": username} for username in usernames]}
+        )
+    )
+
+
+def _mock_user(respx_mock, username, status_code=200):
+    return respx_mock.get(f"http://fasjson.example.com/v1/users/{username}/").mock(
+        return_value=httpx.Response(status_code, json={"result": {"username": username}})
+    )
+
+
+async def test_get_users_by_matrix_id_indexed(respx_mock, indexed_client):
+    search = _mock_search(respx_mock, "dummy")
+    user = _mock_user(respx_mock, "dummy")
+    assert await indexed_client.get_users_by_matrix_id("@dummy:example.com") == {
+        "username": "dummy"
+    }
+    assert search.call_count == 1
+    assert await indexed_client.matrix_ids.get("@dummy:example.com") == ("dummy", False)
+    # The next lookups don't search
+    assert await indexed_client.get_users_by_matrix_id("@dummy:example.com") == {
+        "username": "dummy"
+    }
+    assert search.call_count == 1
+    assert user.call_count == 1
+
+
+async def test_get_users_by_matrix_id_refreshed(respx_mock, indexed_client):
+    indexed_client.matrix_ids.refresh_interval = 0
+    await indexed_client.matrix_ids.set("@dummy:example.com", "dummy")
+    search = _mock_search(respx_mock, "dummy2")
+    _mock_user(respx_mock, "dummy")
+    # The stale username is used, and checked in the background
+    assert await indexed_client.get_users_by_matrix_id("@dummy:example.com") == {
+        "username": "dummy"
+    }
+    await asyncio.gather(*indexed_client.upstream._background_tasks)
+    assert search.call_count == 1
+    known = await indexed_client.matrix_ids.get("@dummy:example.com")
+    assert known[0] == "dummy2"
+
+
+async def test_get_users_by_matrix_id_indexed_user_gone(respx_mock, indexed_client):
+    await indexed_client.matrix_ids.set("@dummy:example.com", "olddummy")
+    _mock_user(respx_mock, "olddummy", status_code=404)
+    search = _mock_search(respx_mock)
+    with pytest.raises(InfoGatherError, match="No Fedora Accounts users have the"):
+        await indexed_client.get_users_by_matrix_id("@dummy:example.com")
+    assert search.call_count == 1
+    assert await indexed_client.matrix_ids.get("@dummy:example.com") is None
+
+
+@pytest.fixture
+def missing_client():
+    return FasjsonClient("http://fasjson.example.com", users=TTLCache(), missing=TTLCache(ttl=60))
+
+
+async def test_missing_user(respx_mock, missing_client):
+    route = _mock_user(respx_mock, "nosuchuser", status_code=404)
+    for _ in range(2):
+        with pytest.raises(
+            InfoGatherError, match="Sorry, but Fedora Accounts user 'nosuchuser' does not exist"
+        ):
+            await missing_client.get_user("nosuchuser")
+    assert route.call_count == 1
+
+
+async def test_missing_user_expires(respx_mock, missing_client, clock):
+    route = _mock_user(respx_mock, "newbie", status_code=404)
+    with pytest.raises(InfoGatherError):
+        await missing_client.get_user("newbie")
+    # The account is created, the lookups within the TTL don't extend it
+    route.mock(return_value=httpx.Response(200, json={"result": {"username": "newbie"}}))
+    for _ in range(2):
+        clock.return_value += 25
+        with pytest.raises(InfoGatherError):
+            await missing_client.get_user("newbie")
+    assert route.call_count == 1
+    clock.return_value += 10
+    assert await missing_client.get_user("newbie") == {"username": "newbie"}
+    assert route.call_count == 2
+
+
+async def test_missing_user_does_not_mask_success(respx_mock, missing_client):
+    missing_client.missing.set(("user", "dummy"), True)
+    missing_client.users.set("dummy", CachedUser(frozenset(USER_FIELDS), {"username": "dummy"}))
+    assert await missing_client.get_user("dummy") == {"username": "dummy"}
+
+
+@pytest.mark.parametrize("method", ["get_group", "get_group_membership"])
+async def test_missing_group(respx_mock, missing_client, method):
+    route = respx_mock.get(
+        url__startswith="http://fasjson.example.com/v1/groups/nosuchgroup/"
+    ).mock(return_value=httpx.Response(404, json={}))
+    for _ in range(2):
+        with pytest.raises(InfoGatherError, match="Sorry, but group 'nosuchgroup' does not exist"):
+            await getattr(missing_client, method)("nosuchgroup")
+    assert route.call_count == 1
+    # Both methods share what they found missing
+    with pytest.raises(InfoGatherError):
+        await missing_client.get_group("nosuchgroup")
+    assert route.call_count == 1
+
+
+async def test_missing_matrix_id(respx_mock, missing_client):
+    search = _mock_search(respx_mock)
+    for _ in range(2):
+        with pytest.raises(InfoGatherError, match="No Fedora Accounts users have the"):
+            await missing_client.get_users_by_matrix_id("@dummy:example.com")
+    assert search.call_count == 1
+
+
+async def test_missing_matrix_id_expires(respx_mock, missing_client, clock):
+    search = _mock_search(respx_mock)
+    for _ in range(3):
+        with pytest.raises(InfoGatherError):
+            await missing_client.get_users_by_matrix_id("@dummy:example.com")
+        clock.return_value += 30
+    assert search.call_count == 2
+
+
+async def test_missing_errors_not_cached(respx_mock, missing_client):
+    route = _mock_user(respx_mock, "dummy", status_code=500)
+    for _ in range(2):
+        with pytest.raises(InfoGatherError, match="code 500"):
+            await missing_client.get_user("dummy")
+    assert route.call_count == 2
+    assert len(missing_client.missing) == 0
+
+
+async def test_missing_disabled(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = _mock_user(respx_mock, "nosuchuser", status_code=404)
+    for _ in range(2):
+        with pytest.raises(InfoGatherError):
+            await client.get_user("nosuchuser")
+    assert route.call_count == 2
+
+
+def _paginated(request):
+    """Serve 5 members, 2 per page"""
+    members = [{"username": f"member{n}"} for n in range(1, 6)]
+    page_size = int(request.url.params["page_size"])
+    page_number = int(request.url.params["page"])
+    start = (page_number - 1) * page_size
+    return httpx.Response(
+        200,
+        json={
+            "result": members[start : start + page_size],
+            "page": {
+                "total_results": len(members),
+                "page_size": page_size,
+                "page_number": page_number,
+                "total_pages": -(-len(members) // page_size),
+            },
+        },
+    )
+
+
+async def test_iter_group_membership(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/biscuits/sponsors/").mock(
+        side_effect=_paginated
+    )
+    pages = [page async for page in client.iter_group_membership("biscuits", "sponsors", 2)]
+    assert pages == [
+        ([{"username": "member1"}, {"username": "member2"}], 5),
+        ([{"username": "member3"}, {"username": "member4"}], 5),
+        ([{"username": "member5"}], 5),
+    ]
+    assert route.call_count == 3
+    assert route.calls[0].request.headers["X-Fields"] == "username,human_name,ircnicks"
+
+
+async def test_iter_group_membership_stops_early(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/biscuits/members/").mock(
+        side_effect=_paginated
+    )
+    async for _page, total in client.iter_group_membership("biscuits", page_size=2):
+        assert total == 5
+        break
+    assert route.call_count == 1
+
+
+async def test_iter_group_membership_unpaginated(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    respx_mock.get("http://fasjson.example.com/v1/groups/biscuits/members/").mock(
+        return_value=httpx.Response(200, json={"result": [{"username": "member1"}]})
+    )
+    pages = [page async for page in client.iter_group_membership("biscuits")]
+    assert pages == [([{"username": "member1"}], None)]
+
+
+async def test_iter_group_membership_missing(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", missing=TTLCache(ttl=60))
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/nosuchgroup/members/").mock(
+        return_value=httpx.Response(404, json={})
+    )
+    for _ in range(2):
+        with pytest.raises(InfoGatherError, match="Sorry, but group 'nosuchgroup' does not exist"):
+            async for _page in client.iter_group_membership("nosuchgroup"):
+                pass  # pragma: no cover
+    assert route.call_count == 1
+
+
+async def test_get_users(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    dummy = _mock_user(respx_mock, "dummy")
+    _mock_user(respx_mock, "other")
+    _mock_user(respx_mock, "nosuchuser", status_code=404)
+    _mock_search(respx_mock, "fromsearch")
+    results = await client.get_users(
+        ["dummy", "nosuchuser", "@dummy:example.com", "other", "dummy"]
+    )
+    assert results[0] == {"username": "dummy"}
+    assert isinstance(results[1], InfoGatherError)
+    assert results[1].message == "Sorry, but Fedora Accounts user 'nosuchuser' does not exist"
+    assert results[2] == {"username": "fromsearch"}
+    assert results[3] == {"username": "other"}
+    # Duplicates are only looked up once
+    assert results[4] is results[0]
+    assert dummy.call_count == 1
+
+
+async def test_get_users_transport_error(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    _mock_user(respx_mock, "dummy")
+    _mock_user(respx_mock, "other")
+    respx_mock.get("http://fasjson.example.com/v1/users/broken/").mock(
+        side_effect=httpx.ConnectError("Connection refused")
+    )
+    results = await client.get_users(["dummy", "broken", "other"])
+    assert results[0] == {"username": "dummy"}
+    assert isinstance(results[1], httpx.ConnectError)
+    assert results[2] == {"username": "other"}
+
+
+async def test_get_users_concurrency(monkeypatch):
+    client = FasjsonClient("http://fasjson.example.com")
+    running = 0
+    max_running = 0
+
+    async def get_user(username, fields):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return {"username": username}
+
+    monkeypatch.setattr(client, "get_user", get_user)
+    names = [f"user{n}" for n in range(10)]
+    results = await client.get_users(names, max_concurrency=3)
+    assert [user["username"] for user in results] == names
+    assert max_running == 3
+
+
+def test_cached_user_mentions():
+    entry = CachedUser(
+        frozenset(["username", "human_name", "ircnicks"]),
+        {
+            "username": "dummy",
+            "human_name": "Dummy User",
+            "ircnicks": ["irc:/dummy", "matrix:/dummy", "matrix://example.com/dummy"],
+        },
+    )
+    assert entry.mxids == ("@dummy:fedora.im", "@dummy:example.com")
+    assert entry.mentions == {
+        "@dummy:fedora.im": "[Dummy User](https://matrix.to/#/@dummy:fedora.im)",
+        "@dummy:example.com": "[Dummy User](https://matrix.to/#/@dummy:example.com)",
+    }
+    assert entry.mention == (
+        "dummy ([@dummy:fedora.im](https://matrix.to/#/@dummy:fedora.im), "
+        "[@dummy:example.com](https://matrix.to/#/@dummy:example.com))"
+    )
+    assert CachedUser(frozenset(["username"]), {"username": "dummy"}).mention == "dummy"
+
+
+def test_remember_member():
+    client = FasjsonClient("http://fasjson.example.com", users=TTLCache())
+    member = {"username": "dummy", "human_name": "Dummy User", "ircnicks": ["matrix:/dummy"]}
+    entry = client.remember_member(member)
+    assert entry.mention == "[Dummy User](https://matrix.to/#/@dummy:fedora.im)"
+    # Computed only once
+    assert client.remember_member(dict(member)) is entry
+    # The member has changed
+    changed = client.remember_member({**member, "human_name": "Dummy"})
+    assert changed.mention == "[Dummy](https://matrix.to/#/@dummy:fedora.im)"
+    assert client.users.get("dummy") is changed
+
+
+def test_remember_member_without_cache():
+    client = FasjsonClient("http://fasjson.example.com")
+    entry = client.remember_member({"username": "dummy"})
+    assert entry.mention == "dummy"
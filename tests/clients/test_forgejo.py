@@ -29,7 +29,7 @@ async def test_get_issue(monkeypatch, org, repo, issue_id, params, expected_url)
     monkeypatch.setattr(client, "_get", mock__get)
 
     issue_response = await client.get_issue(repo, issue_id, org, params=params)
-    mock__get.assert_called_once_with(expected_url, params=params)
+    mock__get.assert_called_once_with(expected_url, params=params, cache="issue")
     assert issue_response == issue
 
 
@@ -55,7 +55,7 @@ async def test_get_pull_request(monkeypatch, org, repo, pull_id, params, expecte
     monkeypatch.setattr(client, "_get", mock__get)
 
     pull_request_response = await client.get_pull_request(repo, pull_id, org, params=params)
-    mock__get.assert_called_once_with(expected_url, params=params)
+    mock__get.assert_called_once_with(expected_url, params=params, cache="pull_request")
     assert pull_request_response == pull_request
 
 
@@ -0,0 +1,258 @@
+import asyncio
+import contextlib
+
+import httpx
+import pytest
+
+from fedora.clients.hedge import MIN_SAMPLES, WINDOW, Hedger
+from fedora.clients.pagure import PagureClient
+from fedora.clients.upstream import Upstream
+
+
+def _warm(hedger, latency=0.01, count=MIN_SAMPLES):
+    hedger.latencies.extend([latency] * count)
+    hedger.history.extend([False] * count)
+
+
+class Responder:
+    """Answer each call after the next delay, with the number of the call as status"""
+
+    def __init__(self, *delays):
+        self.delays = delays
+        self.call_count = 0
+
+    async def __call__(self):
+        index = self.call_count
+        self.call_count += 1
+        await asyncio.sleep(self.delays[index])
+        return httpx.Response(200 + index)
+
+
+def test_delay():
+    hedger = Hedger("pagureio", percentile=90)
+    assert hedger.delay() is None
+    hedger.latencies.extend(i / 100 for i in range(MIN_SAMPLES - 1))
+    assert hedger.delay() is None
+    hedger.latencies.append(1.0)
+    assert hedger.delay() == 0.18
+    hedger.percentile = 100
+    assert hedger.delay() == 1.0
+
+
+def test_window():
+    hedger = Hedger("pagureio")
+    _warm(hedger, count=WINDOW + 10)
+    assert len(hedger.latencies) == WINDOW
+
+
+async def test_disabled():
+    hedger = Hedger("pagureio", percentile=0)
+    _warm(hedger)
+    func = Responder(0.05)
+    assert (await hedger.call(func)).status_code == 200
+    assert func.call_count == 1
+    assert len(hedger.latencies) == MIN_SAMPLES + 1
+
+
+async def test_fast_response_is_not_hedged():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger, latency=0.05)
+    func = Responder(0.0)
+    assert (await hedger.call(func)).status_code == 200
+    assert func.call_count == 1
+    assert hedger.hedges == 0
+    assert hedger.history[-1] is False
+
+
+async def test_hedge_wins():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+    func = Responder(1.0, 0.0)
+    assert (await hedger.call(func)).status_code == 201
+    assert func.call_count == 2
+    assert hedger.hedges == 1
+    assert hedger.history[-1] is True
+
+
+async def test_first_wins_after_hedging():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+    func = Responder(0.03, 1.0)
+    assert (await hedger.call(func)).status_code == 200
+    assert func.call_count == 2
+
+
+async def test_failed_copy_waits_for_the_other():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+
+    async def _slow_failure():
+        await asyncio.sleep(0.03)
+        raise httpx.ReadError("broken")
+
+    async def _slower_success():
+        await asyncio.sleep(0.03)
+        return httpx.Response(201)
+
+    copies = iter([_slow_failure, _slower_success])
+    response = await hedger.call(lambda: next(copies)())
+    assert response.status_code == 201
+
+
+async def test_cancelled_copy():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+
+    async def _cancelled():
+        await asyncio.sleep(0.03)
+        raise asyncio.CancelledError()
+
+    async def _success():
+        await asyncio.sleep(0.03)
+        return httpx.Response(201)
+
+    copies = iter([_cancelled, _success])
+    response = await hedger.call(lambda: next(copies)())
+    assert response.status_code == 201
+
+
+async def test_every_copy_fails():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+
+    async def _fail():
+        await asyncio.sleep(0.03)
+        raise httpx.ReadError("broken")
+
+    with pytest.raises(httpx.ReadError):
+        await hedger.call(_fail)
+    assert hedger.hedges == 1
+
+
+async def test_both_done_at_once():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+    release = asyncio.Event()
+    copies = iter([httpx.Response(200), httpx.ReadError("broken")])
+
+    async def _respond():
+        result = next(copies)
+        await release.wait()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    call = asyncio.create_task(hedger.call(_respond))
+    await asyncio.sleep(0.05)
+    release.set()
+    assert (await call).status_code == 200
+
+
+async def test_max_rate():
+    hedger = Hedger("pagureio", percentile=95, max_rate=0.1)
+    _warm(hedger)
+    # 2 hedges out of the last 20 requests
+    hedger.history[0] = hedger.history[1] = True
+    func = Responder(0.05)
+    assert (await hedger.call(func)).status_code == 200
+    assert func.call_count == 1
+    assert hedger.hedges == 0
+    # The rate is low enough again
+    hedger.history.extend([False] * 10)
+    func = Responder(0.05, 1.0)
+    assert (await hedger.call(func)).status_code == 200
+    assert func.call_count == 2
+    assert hedger.hedges == 1
+
+
+async def test_cancelled():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+    func = Responder(1.0, 1.0)
+    call = asyncio.create_task(hedger.call(func))
+    await asyncio.sleep(0.05)
+    assert func.call_count == 2
+    call.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await call
+    assert len(hedger.latencies) == MIN_SAMPLES
+
+
+async def test_queue_wait_is_not_counted():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+
+    @contextlib.asynccontextmanager
+    async def _queued():
+        await asyncio.sleep(0.1)
+        yield
+
+    func = Responder(0.0)
+    assert (await hedger.call(func, _queued)).status_code == 200
+    assert func.call_count == 1
+    assert hedger.hedges == 0
+    assert hedger.latencies[-1] < 0.05
+
+
+async def test_first_copy_fails_in_queue():
+    hedger = Hedger("pagureio", percentile=95, max_rate=1)
+    _warm(hedger)
+
+    @contextlib.asynccontextmanager
+    async def _busy():
+        raise httpx.PoolTimeout("busy")
+        yield  # pragma: no cover
+
+    func = Responder(0.0)
+    with pytest.raises(httpx.PoolTimeout):
+        await hedger.call(func, _busy)
+    assert func.call_count == 0
+    assert hedger.hedges == 0
+
+
+async def test_client_queue_is_not_hedged(respx_mock):
+    client = PagureClient(
+        "http://pagure.example.com",
+        upstream=Upstream(
+            "pagureio", {"hedge_percentile": 95, "hedge_max_rate": 1, "max_concurrency": 1}
+        ),
+    )
+    _warm(client.upstream.hedger)
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(
+        return_value=httpx.Response(200, json={"title": "biscuits"})
+    )
+
+    async def _hold_slot():
+        async with client.upstream.limiter.limit():
+            await asyncio.sleep(0.1)
+
+    holder = asyncio.create_task(_hold_slot())
+    await asyncio.sleep(0)
+    assert await client.get_issue("biscuits", "1") == {"title": "biscuits"}
+    await holder
+    assert route.call_count == 1
+    assert client.upstream.hedger.hedges == 0
+
+
+async def test_client_hedges(respx_mock):
+    client = PagureClient(
+        "http://pagure.example.com",
+        upstream=Upstream("pagureio", {"hedge_percentile": 95, "hedge_max_rate": 1}),
+    )
+    _warm(client.upstream.hedger, latency=0.05)
+    delays = iter([1.0, 0.0])
+
+    async def _respond(request):
+        await asyncio.sleep(next(delays))
+        return httpx.Response(200, json={"title": "biscuits"})
+
+    respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(side_effect=_respond)
+    assert await client.get_issue("biscuits", "1") == {"title": "biscuits"}
+    assert client.upstream.hedger.hedges == 1
+
+
+def test_upstream_hedger_settings():
+    upstream = Upstream("pagureio", {"hedge_percentile": 99, "hedge_max_rate": 0.2})
+    assert upstream.hedger.name == "pagureio"
+    assert upstream.hedger.percentile == 99
+    assert upstream.hedger.max_rate == 0.2
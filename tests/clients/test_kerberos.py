@@ -0,0 +1,165 @@
+import asyncio
+import logging
+from unittest import mock
+
+import httpx
+import pytest
+from gssapi.exceptions import GSSError
+
+from fedora.clients import kerberos
+from fedora.clients.fasjson import FasjsonClient
+from fedora.clients.kerberos import CredentialsRenewer, SessionSPNEGOAuth, get_lifetime
+
+
+class FakeCredentials:
+    def __init__(self, lifetime):
+        self._lifetime = lifetime
+
+    @property
+    def lifetime(self):
+        if self._lifetime is None:
+            raise GSSError()
+        return self._lifetime
+
+
+@pytest.fixture
+def fasjson(monkeypatch):
+    client = FasjsonClient("http://fasjson.example.com")
+    context = mock.Mock()
+    context.step.return_value = b"token"
+    monkeypatch.setattr(client.auth, "_make_context", mock.Mock(return_value=context))
+    return client
+
+
+def _authenticating_server(request):
+    if "gssapi_session=valid" in request.headers.get("Cookie", ""):
+        return httpx.Response(200, json={"result": {"username": "dummy"}})
+    if request.headers.get("Authorization") == "Negotiate dG9rZW4=":
+        return httpx.Response(
+            200,
+            json={"result": {"username": "dummy"}},
+            headers={"Set-Cookie": "gssapi_session=valid; Path=/"},
+        )
+    return httpx.Response(401, headers={"WWW-Authenticate": "Negotiate"})
+
+
+async def test_session_reused(respx_mock, fasjson):
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        side_effect=_authenticating_server
+    )
+    await fasjson.get_user("dummy")
+    # The first request is challenged, then authenticated
+    assert route.call_count == 2
+    assert fasjson.auth._make_context.call_count == 1
+    assert fasjson.auth.opportunistic_auth is True
+
+    await fasjson.get_user("dummy")
+    await fasjson.get_user("dummy")
+    # The session cookie is enough for the next ones
+    assert route.call_count == 4
+    assert fasjson.auth._make_context.call_count == 1
+    assert "Authorization" not in route.calls.last.request.headers
+
+
+async def test_session_rejected(respx_mock, fasjson):
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        side_effect=_authenticating_server
+    )
+    fasjson.upstream.http.cookies.set("gssapi_session", "expired")
+    await fasjson.get_user("dummy")
+    assert route.call_count == 2
+    assert "Authorization" not in route.calls[0].request.headers
+    assert route.calls[1].request.headers["Authorization"] == "Negotiate dG9rZW4="
+    assert fasjson.auth._make_context.call_count == 1
+
+
+async def test_session_renegotiated_on_expiring_credentials(respx_mock, fasjson):
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy/").mock(
+        side_effect=_authenticating_server
+    )
+    fasjson.auth.opportunistic_auth = True
+    fasjson.upstream.http.cookies.set("gssapi_session", "valid")
+    fasjson.auth.set_credentials(FakeCredentials(100))
+    assert fasjson.auth.renegotiate is False
+    fasjson.auth.set_credentials(FakeCredentials(36000))
+    assert fasjson.auth.renegotiate is True
+
+    await fasjson.get_user("dummy")
+    assert route.call_count == 1
+    assert route.calls.last.request.headers["Authorization"] == "Negotiate dG9rZW4="
+    assert fasjson.auth.renegotiate is False
+
+
+def test_get_lifetime():
+    assert get_lifetime(FakeCredentials(42)) == 42
+    assert get_lifetime(FakeCredentials(None)) == 0
+
+
+@pytest.mark.parametrize(
+    "keytab,ccache,expected_store",
+    [
+        (None, None, None),
+        (None, "FILE:/tmp/ccache", {"ccache": "FILE:/tmp/ccache"}),
+        ("/etc/bot.keytab", "", {"client_keytab": "/etc/bot.keytab"}),
+        (
+            "/etc/bot.keytab",
+            "FILE:/tmp/ccache",
+            {"client_keytab": "/etc/bot.keytab", "ccache": "FILE:/tmp/ccache"},
+        ),
+    ],
+)
+def test_renewer_acquire(monkeypatch, keytab, ccache, expected_store):
+    credentials = mock.Mock()
+    monkeypatch.setattr(kerberos.gssapi, "Credentials", credentials)
+    renewer = CredentialsRenewer(SessionSPNEGOAuth(), keytab=keytab, ccache=ccache)
+    assert renewer.acquire() is credentials.return_value
+    credentials.assert_called_once_with(usage="initiate", store=expected_store)
+
+
+@pytest.mark.parametrize("lifetime,warns", [(100, True), (36000, False)])
+async def test_renewer_renew(monkeypatch, caplog, lifetime, warns):
+    auth = SessionSPNEGOAuth()
+    renewer = CredentialsRenewer(auth)
+    creds = FakeCredentials(lifetime)
+    monkeypatch.setattr(renewer, "acquire", mock.Mock(return_value=creds))
+    with caplog.at_level(logging.WARNING):
+        await renewer.renew()
+    assert auth.creds is creds
+    assert (f"The Kerberos credentials expire in {lifetime} seconds" in caplog.text) is warns
+
+
+async def test_renewer_renew_error(monkeypatch, caplog):
+    auth = SessionSPNEGOAuth()
+    renewer = CredentialsRenewer(auth)
+    error = GSSError()
+    error.gen_message = mock.Mock(return_value="No credentials cache found")
+    monkeypatch.setattr(renewer, "acquire", mock.Mock(side_effect=error))
+    await renewer.renew()
+    assert auth.creds is None
+    assert "Could not renew the Kerberos credentials: No credentials cache found" in caplog.text
+
+
+async def test_renewer_start_stop(monkeypatch):
+    renewer = CredentialsRenewer(SessionSPNEGOAuth(), interval=0.01)
+    renew = mock.AsyncMock()
+    monkeypatch.setattr(renewer, "renew", renew)
+    # Stopping before starting does nothing
+    await renewer.stop()
+    renewer.start()
+    await asyncio.sleep(0.05)
+    await renewer.stop()
+    assert renew.call_count > 1
+    assert renewer._task is None
+
+
+async def test_renewer_disabled(monkeypatch):
+    renewer = CredentialsRenewer(SessionSPNEGOAuth(), interval=0)
+    renewer.start()
+    assert renewer._task is None
+
+
+async def test_plugin_renewer(plugin):
+    assert plugin.credentials_renewer.auth is plugin.fasjsonclient.auth
+    assert plugin.credentials_renewer.auth.min_lifetime == 600
+    # Disabled in the tests config
+    assert plugin.credentials_renewer._task is None
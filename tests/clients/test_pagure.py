@@ -31,7 +31,7 @@ async def test_get_issue(monkeypatch, project, issue_id, namespace, params, expe
     monkeypatch.setattr(client, "_get", mock__get)
 
     issue_response = await client.get_issue(project, issue_id, namespace=namespace, params=params)
-    mock__get.assert_called_once_with(expected_url, params=params)
+    mock__get.assert_called_once_with(expected_url, params=params, cache="issue")
     assert issue_response == issue
 
 
@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from fedora.clients.pagure import PagureClient
+from fedora.clients.ratelimit import RateLimiter
+from fedora.clients.upstream import Upstream
+from fedora.exceptions import InfoGatherError
+
+BUSY = "Sorry, pagureio is too busy at the moment, please try again later"
+
+
+async def test_max_concurrency():
+    limiter = RateLimiter("pagureio", max_concurrency=2, rate=0)
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _request():
+        nonlocal in_flight, max_in_flight
+        async with limiter.limit():
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    await asyncio.gather(*(_request() for _ in range(6)))
+    assert max_in_flight == 2
+
+
+async def test_rate():
+    limiter = RateLimiter("pagureio", max_concurrency=0, rate=100, burst=2)
+    start = time.monotonic()
+    for _ in range(2):
+        async with limiter.limit():
+            pass
+    # The burst goes right away
+    assert time.monotonic() - start < 0.01
+    for _ in range(3):
+        async with limiter.limit():
+            pass
+    assert time.monotonic() - start >= 0.03
+
+
+async def test_disabled():
+    limiter = RateLimiter("pagureio", max_concurrency=0, rate=0, burst=0)
+    for _ in range(100):
+        async with limiter.limit():
+            pass
+
+
+async def test_max_queue_wait(caplog):
+    limiter = RateLimiter("pagureio", max_concurrency=1, rate=0, max_queue_wait=0.01)
+    release = asyncio.Event()
+
+    async def _hang():
+        async with limiter.limit():
+            await release.wait()
+
+    task = asyncio.create_task(_hang())
+    await asyncio.sleep(0)
+    with pytest.raises(InfoGatherError, match=BUSY):
+        async with limiter.limit():
+            pass  # pragma: no cover
+    assert "Request to pagureio waited more than 0.01s to go" in caplog.text
+    release.set()
+    await task
+    # The request that gave up did not keep its slot
+    async with limiter.limit():
+        pass
+
+
+async def test_max_queue_wait_for_token():
+    limiter = RateLimiter("pagureio", max_concurrency=1, rate=1, burst=1, max_queue_wait=0.01)
+    async with limiter.limit():
+        pass
+    with pytest.raises(InfoGatherError, match=BUSY):
+        async with limiter.limit():
+            pass  # pragma: no cover
+    # The semaphore was released when waiting for the token timed out
+    assert not limiter._semaphore.locked()
+
+
+async def test_client_queues(respx_mock):
+    client = PagureClient(
+        "http://pagure.example.com",
+        upstream=Upstream("pagureio", {"max_concurrency": 1}),
+    )
+    in_flight = 0
+    max_in_flight = 0
+
+    async def _respond(request):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return httpx.Response(200, json={"title": "biscuits"})
+
+    respx_mock.get(url__regex=r"http://pagure.example.com/api/0/biscuits/issue/\d").mock(
+        side_effect=_respond
+    )
+    results = await asyncio.gather(*(client.get_issue("biscuits", str(i)) for i in range(3)))
+    assert results == [{"title": "biscuits"}] * 3
+    assert max_in_flight == 1
+
+
+def test_upstream_limiter_settings():
+    upstream = Upstream(
+        "pagureio", {"max_concurrency": 3, "rate": 5, "burst": 7, "max_queue_wait": 2}
+    )
+    assert upstream.limiter.name == "pagureio"
+    assert upstream.limiter._semaphore._value == 3
+    assert upstream.limiter.rate == 5
+    assert upstream.limiter.burst == 7
+    assert upstream.limiter.max_queue_wait == 2
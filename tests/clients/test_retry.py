@@ -0,0 +1,137 @@
+import asyncio
+import logging
+from unittest import mock
+
+import httpx
+import pytest
+
+from fedora.clients.deadline import deadline
+from fedora.clients.pagure import PagureClient
+from fedora.clients.retry import BUDGET_CAP, RetryPolicy
+from fedora.clients.upstream import Upstream
+from fedora.exceptions import InfoGatherError
+
+
+def _policy(**kwargs):
+    return RetryPolicy("pagureio", **{"delay": 0.001, **kwargs})
+
+
+async def test_retry_error(caplog):
+    policy = _policy()
+    func = mock.AsyncMock(side_effect=[httpx.ConnectError("refused"), httpx.Response(200)])
+    with caplog.at_level(logging.WARNING):
+        response = await policy.call(func)
+    assert response.status_code == 200
+    assert func.call_count == 2
+    assert policy.retries == 1
+    assert "Request to pagureio failed (ConnectError('refused')), retrying in" in caplog.text
+
+
+async def test_retry_status(caplog):
+    policy = _policy(max_tries=3)
+    func = mock.AsyncMock(return_value=httpx.Response(503))
+    response = await policy.call(func)
+    # The last response is returned once out of tries
+    assert response.status_code == 503
+    assert func.call_count == 3
+    assert "Request to pagureio failed (status 503), retrying in" in caplog.text
+
+
+async def test_max_tries():
+    policy = _policy(max_tries=2)
+    func = mock.AsyncMock(side_effect=httpx.ReadTimeout("timed out"))
+    with pytest.raises(httpx.ReadTimeout):
+        await policy.call(func)
+    assert func.call_count == 2
+
+
+@pytest.mark.parametrize(
+    "result",
+    [
+        httpx.Response(200),
+        httpx.Response(404),
+        httpx.Response(500),
+        httpx.UnsupportedProtocol("nope"),
+        InfoGatherError("Sorry"),
+    ],
+)
+async def test_not_retried(result):
+    policy = _policy()
+    if isinstance(result, Exception):
+        func = mock.AsyncMock(side_effect=result)
+        with pytest.raises(type(result)):
+            await policy.call(func)
+    else:
+        func = mock.AsyncMock(return_value=result)
+        assert await policy.call(func) is result
+    assert func.call_count == 1
+    assert policy.retries == 0
+
+
+async def test_disabled():
+    policy = _policy(max_tries=1)
+    func = mock.AsyncMock(return_value=httpx.Response(502))
+    assert (await policy.call(func)).status_code == 502
+    assert func.call_count == 1
+
+
+async def test_budget():
+    policy = _policy(max_tries=2, budget=0.5)
+    policy.tokens = 0
+    func = mock.AsyncMock(return_value=httpx.Response(502))
+    # The request itself earns half a retry
+    await policy.call(func)
+    assert func.call_count == 1
+    # The next one earns enough
+    func.reset_mock()
+    await policy.call(func)
+    assert func.call_count == 2
+    assert policy.tokens == 0
+    # The budget is capped
+    for _ in range(BUDGET_CAP * 3):
+        await policy.call(mock.AsyncMock(return_value=httpx.Response(200)))
+    assert policy.tokens == BUDGET_CAP
+
+
+async def test_deadline():
+    policy = _policy()
+
+    async def _slow():
+        await asyncio.sleep(0.02)
+        return httpx.Response(502)
+
+    func = mock.AsyncMock(side_effect=_slow)
+    with deadline(0.01):
+        response = await policy.call(func)
+    assert response.status_code == 502
+    assert func.call_count == 1
+
+
+async def test_client_retries(respx_mock):
+    client = PagureClient(
+        "http://pagure.example.com", upstream=Upstream("pagureio", {"retry_delay": 0.001})
+    )
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(
+        side_effect=[httpx.Response(502), httpx.Response(200, json={"title": "biscuits"})]
+    )
+    assert await client.get_issue("biscuits", "1") == {"title": "biscuits"}
+    assert route.call_count == 2
+
+
+async def test_client_open_breaker_stops_retries(respx_mock):
+    client = PagureClient(
+        "http://pagure.example.com",
+        upstream=Upstream("pagureio", {"retry_delay": 0.001, "breaker_threshold": 1}),
+    )
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits/issue/1").mock(
+        side_effect=httpx.ConnectError("refused")
+    )
+    with pytest.raises(InfoGatherError, match="pagureio is not responding"):
+        await client.get_issue("biscuits", "1")
+    assert route.call_count == 1
+
+
+def test_upstream_retry_settings():
+    upstream = Upstream("pagureio", {"retry_budget": 0.3})
+    assert upstream.retry.name == "pagureio"
+    assert upstream.retry.budget == 0.3
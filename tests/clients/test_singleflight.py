@@ -0,0 +1,149 @@
+import asyncio
+import gc
+
+import httpx
+import pytest
+
+from fedora.clients.base import request_key
+from fedora.clients.fasjson import FasjsonClient
+from fedora.clients.pagure import PagureClient
+from fedora.clients.singleflight import SingleFlight
+from fedora.exceptions import InfoGatherError
+
+
+def slow_response(*args, **kwargs):
+    async def _respond(request):
+        await asyncio.sleep(0.01)
+        return httpx.Response(*args, **kwargs)
+
+    return _respond
+
+
+async def test_identical_requests_coalesced(respx_mock):
+    client = PagureClient("http://pagure.example.com")
+    route = respx_mock.get("http://pagure.example.com/api/0/rpms/biscuits").mock(
+        side_effect=slow_response(200, json={"name": "biscuits"})
+    )
+    results = await asyncio.gather(
+        *[client.get_project("biscuits", namespace="rpms") for _ in range(10)]
+    )
+    assert route.call_count == 1
+    assert results == [{"name": "biscuits"}] * 10
+    assert client.upstream.singleflight._calls == {}
+
+    # Once the request is done, the next one is sent again
+    await client.get_project("biscuits", namespace="rpms")
+    assert route.call_count == 2
+
+
+async def test_different_requests_not_coalesced(respx_mock):
+    client = PagureClient("http://pagure.example.com")
+    route = respx_mock.get(url__startswith="http://pagure.example.com/api/0/biscuits").mock(
+        side_effect=slow_response(200, json={"name": "biscuits"})
+    )
+    await asyncio.gather(
+        client.get_project("biscuits"),
+        client.get_project("biscuits", params={"fields": "name"}),
+        client.get_issue("biscuits", "1"),
+    )
+    assert route.call_count == 3
+
+
+async def test_errors_reach_every_waiter(respx_mock):
+    client = FasjsonClient("http://fasjson.example.com")
+    route = respx_mock.get("http://fasjson.example.com/v1/users/nosuchuser/").mock(
+        side_effect=slow_response(404, json={"message": "not found"})
+    )
+    results = await asyncio.gather(
+        *[client.get_user("nosuchuser") for _ in range(3)], return_exceptions=True
+    )
+    assert route.call_count == 1
+    for result in results:
+        assert isinstance(result, InfoGatherError)
+        assert result.message == "Sorry, but Fedora Accounts user 'nosuchuser' does not exist"
+
+
+async def test_transport_errors_reach_every_waiter(respx_mock):
+    client = PagureClient("http://pagure.example.com")
+
+    async def _fail(request):
+        await asyncio.sleep(0.01)
+        raise httpx.ConnectError("Connection refused")
+
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits").mock(side_effect=_fail)
+    results = await asyncio.gather(
+        *[client.get_project("biscuits") for _ in range(3)], return_exceptions=True
+    )
+    # Retried, but still only once for all the waiters
+    assert route.call_count == 3
+    assert all(isinstance(result, httpx.ConnectError) for result in results)
+
+
+async def test_cancelled_waiter():
+    singleflight = SingleFlight()
+    started = asyncio.Event()
+
+    async def _call():
+        started.set()
+        await asyncio.sleep(0.01)
+        return "biscuits"
+
+    first = asyncio.create_task(singleflight.do("key", _call))
+    await started.wait()
+    second = asyncio.create_task(singleflight.do("key", _call))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "biscuits"
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+
+async def test_all_waiters_cancelled(caplog):
+    singleflight = SingleFlight()
+
+    async def _call():
+        await asyncio.sleep(0.01)
+        raise InfoGatherError("biscuits")
+
+    waiter = asyncio.create_task(singleflight.do("key", _call))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    await asyncio.sleep(0.02)
+    gc.collect()
+    assert singleflight._calls == {}
+    assert "exception was never retrieved" not in caplog.text
+
+
+async def test_call_cancelled():
+    singleflight = SingleFlight()
+    call = asyncio.Event()
+
+    async def _call():
+        await call.wait()
+
+    waiter = asyncio.create_task(singleflight.do("key", _call))
+    await asyncio.sleep(0)
+    singleflight._calls["key"].cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert singleflight._calls == {}
+
+
+@pytest.mark.parametrize(
+    "kwargs,expected",
+    [
+        ({}, ("http://example.com/api", ())),
+        ({"params": {"b": 2, "a": 1}}, ("http://example.com/api?b=2&a=1", ())),
+        (
+            {"headers": {"X-Fields": "username"}, "follow_redirects": True},
+            ("http://example.com/api", (("X-Fields", "username"),)),
+        ),
+    ],
+)
+def test_request_key(kwargs, expected):
+    assert request_key("http://example.com/api", **kwargs) == expected
+
+
+def test_request_key_headers_order():
+    key = request_key("http://example.com/api", headers={"A": "1", "B": "2"})
+    assert hash(key) == hash(request_key("http://example.com/api", headers={"B": "2", "A": "1"}))
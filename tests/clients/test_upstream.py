@@ -0,0 +1,77 @@
+import sys
+
+import httpx
+import pytest
+
+from fedora.clients.pagure import PagureClient
+from fedora.clients.upstream import Upstream, Upstreams
+
+
+def test_upstream_default_settings():
+    upstream = Upstream("biscuits")
+    assert upstream.name == "biscuits"
+    assert upstream.settings["max_connections"] == 20
+    assert upstream.settings["max_keepalive_connections"] == 10
+    assert upstream.settings["keepalive_expiry"] == 30
+
+
+def test_upstreams_settings_override():
+    upstreams = Upstreams(
+        {
+            "default": {"max_connections": 5, "keepalive_expiry": 10},
+            "biscuits": {"max_connections": 50},
+            "cookies": None,
+        }
+    )
+    assert upstreams["biscuits"].settings["max_connections"] == 50
+    assert upstreams["biscuits"].settings["keepalive_expiry"] == 10
+    assert upstreams["biscuits"].settings["max_keepalive_connections"] == 10
+    assert upstreams["cookies"].settings["max_connections"] == 5
+
+
+async def test_upstreams_shared_and_closed():
+    upstreams = Upstreams()
+    upstream = upstreams["biscuits"]
+    unused = upstreams["cookies"]
+    assert upstreams["biscuits"] is upstream
+    http = upstream.http
+    assert upstream.http is http
+    await upstreams.aclose()
+    assert http.is_closed
+    assert unused._http is None
+    assert upstreams["biscuits"] is not upstream
+
+
+async def test_client_reuses_connection(respx_mock):
+    upstream = Upstream("pagure")
+    client = PagureClient("http://pagure.example.com", upstream=upstream)
+    route = respx_mock.get("http://pagure.example.com/api/0/biscuits").mock(
+        return_value=httpx.Response(200, json={"name": "biscuits"})
+    )
+    await client.get_project("biscuits")
+    await client.get_project("biscuits")
+    assert route.call_count == 2
+    assert client.upstream.http is upstream.http
+    assert not upstream.http.is_closed
+
+
+async def test_plugin_closes_upstreams(plugin):
+    http = plugin.fasjsonclient.upstream.http
+    assert plugin.upstreams["fasjson"].http is http
+    await plugin.stop()
+    assert http.is_closed
+
+
+@pytest.mark.parametrize("http2", [True, False])
+def test_upstream_http2(http2):
+    upstream = Upstream("biscuits", {"http2": http2})
+    assert upstream.http._transport._pool._http2 is http2
+    # HTTP/1.1 is always available as a fallback
+    assert upstream.http._transport._pool._http1 is True
+
+
+def test_upstream_http2_unavailable(monkeypatch, caplog):
+    monkeypatch.setitem(sys.modules, "h2", None)
+    upstream = Upstream("biscuits", {"http2": True})
+    assert upstream.http._transport._pool._http2 is False
+    assert "The h2 package is not installed, biscuits will use HTTP/1.1" in caplog.text
@@ -62,6 +62,9 @@ async def plugin(bot, db):
         "bodhi_url": "http://bodhi.example.com",
         "fedorastatus_url": "http://status.example.com",
         "controlroom": "controlroom",
+        "fasjson_kerberos": {"renew_interval": 0},
+        # The tests change issues between commands
+        "cache": {"ttl": {"issue": 0, "pull_request": 0}},
     }
     config = Config(lambda: test_config, lambda: base_config, lambda c: None)
     loader = FileSystemLoader(base_path, plugin_meta)
@@ -80,6 +83,7 @@ async def plugin(bot, db):
         )
         await instance.internal_start()
         yield instance
+        await instance.internal_stop()
 
 
 @pytest.fixture
@@ -0,0 +1,62 @@
+import math
+
+import httpx
+
+
+class FakeFasjson:
+    """A stand-in for FASJSON, serving its users from a dict"""
+
+    def __init__(self, respx_mock, users=None, baseurl="http://fasjson.example.com"):
+        self.users = {user["username"]: user for user in users or []}
+        self.list_route = respx_mock.get(f"{baseurl}/v1/users/").mock(side_effect=self._list)
+        self.user_route = respx_mock.get(url__regex=rf"^{baseurl}/v1/users/[^/]+/$").mock(
+            side_effect=self._get
+        )
+        self.search_route = respx_mock.get(f"{baseurl}/v1/search/users/").mock(
+            side_effect=self._search
+        )
+
+    def _project(self, request, user):
+        fields = request.headers.get("X-Fields")
+        if fields is None:
+            return user
+        return {field: user.get(field) for field in fields.split(",")}
+
+    def _list(self, request):
+        users = sorted(self.users.values(), key=lambda user: user["username"])
+        page_size = int(request.url.params.get("page_size", 40))
+        page_number = int(request.url.params.get("page", 1))
+        start = (page_number - 1) * page_size
+        return httpx.Response(
+            200,
+            json={
+                "result": [
+                    self._project(request, user) for user in users[start : start + page_size]
+                ],
+                "page": {
+                    "total_results": len(users),
+                    "page_size": page_size,
+                    "page_number": page_number,
+                    "total_pages": max(1, math.ceil(len(users) / page_size)),
+                },
+            },
+        )
+
+    def _get(self, request):
+        username = request.url.path.split("/")[-2]
+        if username not in self.users:
+            return httpx.Response(404, json={"message": "not found"})
+        return httpx.Response(200, json={"result": self._project(request, self.users[username])})
+
+    def _search(self, request):
+        ircnick = request.url.params["ircnick__exact"]
+        return httpx.Response(
+            200,
+            json={
+                "result": [
+                    self._project(request, user)
+                    for user in self.users.values()
+                    if ircnick in user.get("ircnicks", [])
+                ]
+            },
+        )
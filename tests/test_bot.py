@@ -49,6 +49,7 @@ async def test_help_group(bot, plugin):
         "**Usage:** !group <subcommand> [...]\n\n"
         "● members <groupname> - Return a list of members of the specified group\n"
         "● sponsors <groupname> - Return a list of owners of the specified group\n"
+        "● more - Return the next members or sponsors of the group listed last\n"
         "● info <groupname> - Return a list of owners of the specified group"
     )
     assert bot.sent[0].content.body == expected
@@ -24,3 +24,12 @@ async def test_bug_no_id(bot, plugin):
     assert len(bot.sent) == 1
     expected_text = "bug_id argument is required. e.g. `!bug 1234567`"
     assert bot.sent[0].content.body == expected_text
+
+
+async def test_bug_error(bot, plugin, respx_mock):
+    respx_mock.get("https://bugzilla.redhat.com/rest/bug/42").mock(
+        return_value=httpx.Response(404, json={"message": "Bug #42 does not exist."})
+    )
+    await bot.send("!bug 42")
+    assert len(bot.sent) == 1
+    assert bot.sent[0].content.body == "Issue querying Bugzilla: Bug #42 does not exist."
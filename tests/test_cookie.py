@@ -1,3 +1,4 @@
+import asyncio
 import time
 from datetime import datetime
 from unittest import mock
@@ -382,3 +383,25 @@ async def test_cookie_give_message_plural(bot, plugin, respx_mock, db, publish):
         "dummy gave a cookie to foobar. They now have 2 cookies, "
         "2 of which were obtained in the Fedora 38 release cycle"
     )
+
+
+async def test_cookie_give_timeout(bot, plugin, respx_mock, db):
+    plugin.config["command_timeout"] = 0.3
+    _mock_user(respx_mock, "dummy")
+    _mock_user(respx_mock, "foobar")
+
+    async def _slow(request):
+        await asyncio.sleep(0.5)
+        return httpx.Response(200, json={"releases": []})
+
+    respx_mock.get("http://bodhi.example.com/releases/", params={"state": "current"}).mock(
+        side_effect=_slow
+    )
+    await bot.send("foobar++")
+    assert len(bot.sent) == 1
+    assert (
+        bot.sent[0].content.body == "Sorry, bodhi took too long to answer, please try again later"
+    )
+    assert await db.fetchval("SELECT COUNT(*) FROM cookies") == 0
+    # Let the request finish before the plugin stops
+    await asyncio.sleep(0.5)
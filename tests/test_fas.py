@@ -1,12 +1,16 @@
+import time
 from datetime import datetime, timezone
 from unittest import mock
 
 import httpx
 import pytest
 import pytz
+from mautrix.types import EventType, Membership
 
 import fedora
 
+from .bot import make_member_event
+
 
 async def test_group_info(bot, plugin, respx_mock):
     respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/").mock(
@@ -97,6 +101,195 @@ async def test_group_members_massive_group(bot, plugin, respx_mock):
     )
 
 
+async def test_group_members_massive_group_paginated(bot, plugin, respx_mock, monkeypatch):
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/massivegroup/members/").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "result": [{"username": f"member{n}"} for n in range(1, 201)],
+                "page": {
+                    "total_results": 5000,
+                    "page_size": 200,
+                    "page_number": 1,
+                    "total_pages": 25,
+                },
+            },
+        ),
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members massivegroup")
+    assert len(bot.sent) == 1
+    assert bot.sent[0].content.body.startswith(
+        "Members of massivegroup (1 to 200 of 5000): member1, member10, member100, "
+    )
+    assert bot.sent[0].content.body.endswith("member99\n Say `!group more` for the next members")
+    # The other pages were not fetched
+    assert route.call_count == 1
+
+
+def _members_pages(request):
+    page_number = int(request.url.params["page"])
+    page_size = int(request.url.params["page_size"])
+    usernames = [f"member{n:03}" for n in range(1, 451)]
+    start = (page_number - 1) * page_size
+    return httpx.Response(
+        200,
+        json={
+            "result": [{"username": name} for name in usernames[start : start + page_size]],
+            "page": {
+                "total_results": len(usernames),
+                "page_size": page_size,
+                "page_number": page_number,
+                "total_pages": 3,
+            },
+        },
+    )
+
+
+async def test_group_more(bot, plugin, respx_mock, monkeypatch):
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/biggroup/members/").mock(
+        side_effect=_members_pages
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members biggroup")
+    assert bot.sent[0].content.body.startswith("Members of biggroup (1 to 200 of 450): member001, ")
+    await bot.send("!group more")
+    assert bot.sent[1].content.body.startswith(
+        "Members of biggroup (201 to 400 of 450): member201, "
+    )
+    assert bot.sent[1].content.body.endswith("member400\n Say `!group more` for the next members")
+    await bot.send("!group more")
+    assert bot.sent[2].content.body.startswith(
+        "Members of biggroup (401 to 450 of 450): member401, "
+    )
+    assert bot.sent[2].content.body.endswith("member450")
+    assert [call.request.url.params["page"] for call in route.calls] == ["1", "2", "3"]
+    # The whole group was listed
+    await bot.send("!group more")
+    assert (
+        bot.sent[3].content.body
+        == "There is nothing more to list, start with `!group members <groupname>`"
+    )
+
+
+async def test_group_members_reply_cached(bot, plugin, respx_mock, monkeypatch):
+    # Only the rendered replies are cached
+    monkeypatch.setitem(plugin.cache.ttls, "group_membership", 0)
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/members/").mock(
+        return_value=httpx.Response(
+            200, json={"result": [{"username": "member1", "ircnicks": ["matrix:/member1"]}]}
+        )
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value={}))
+    await bot.send("!group members dummygroup")
+    await bot.send("!group members dummygroup")
+    assert route.call_count == 1
+    # The mentions depend on the room
+    await bot.send("!group members dummygroup", room_id="otherroom")
+    assert route.call_count == 2
+    # Someone joined the room
+    await bot.dispatch(EventType.ROOM_MEMBER, make_member_event("@member1:fedora.im"))
+    await bot.send("!group members dummygroup")
+    assert route.call_count == 3
+    # A change of display name doesn't change the mentions
+    await bot.dispatch(
+        EventType.ROOM_MEMBER, make_member_event("@member1:fedora.im", displayname="Member 1")
+    )
+    await bot.send("!group members dummygroup")
+    assert route.call_count == 3
+    now = time.monotonic()
+    monkeypatch.setattr(fedora.clients.cache, "monotonic", lambda: now + fedora.fas.REPLY_TTL)
+    await bot.send("!group members dummygroup")
+    assert route.call_count == 4
+    assert len(bot.sent) == 6
+    assert {sent.content.body for sent in bot.sent} == {"Members of dummygroup: member1"}
+
+
+async def test_group_more_reply_cached(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/groups/biggroup/members/").mock(
+        side_effect=_members_pages
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members biggroup")
+    # Another user gets the same reply, and can ask for more
+    await bot.send("!group members biggroup", sender="@otheruser:example.com")
+    assert bot.sent[1].content.body == bot.sent[0].content.body
+    await bot.send("!group more", sender="@otheruser:example.com")
+    assert bot.sent[2].content.body.startswith("Members of biggroup (201 to 400 of 450): ")
+
+
+async def test_group_more_nothing_listed(bot, plugin):
+    await bot.send("!group more")
+    assert len(bot.sent) == 1
+    assert (
+        bot.sent[0].content.body
+        == "There is nothing more to list, start with `!group members <groupname>`"
+    )
+
+
+async def test_group_more_per_user(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/groups/biggroup/members/").mock(
+        side_effect=_members_pages
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members biggroup")
+    await bot.send("!group more", sender="@otheruser:example.com")
+    assert bot.sent[1].content.body.startswith("There is nothing more to list")
+
+
+async def test_group_more_expired(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/groups/biggroup/members/").mock(
+        side_effect=_members_pages
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members biggroup")
+    now = time.monotonic()
+    monkeypatch.setattr(fedora.clients.cache, "monotonic", lambda: now + fedora.fas.CURSOR_TTL + 1)
+    await bot.send("!group more")
+    assert bot.sent[1].content.body.startswith("There is nothing more to list")
+
+
+async def test_group_more_listing_small_group(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/groups/biggroup/members/").mock(
+        side_effect=_members_pages
+    )
+    respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/members/").mock(
+        return_value=httpx.Response(200, json={"result": [{"username": "member1"}]})
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members biggroup")
+    await bot.send("!group members dummygroup")
+    assert bot.sent[1].content.body == "Members of dummygroup: member1"
+    # Listing a group that fits in one message ends the previous listing
+    await bot.send("!group more")
+    assert bot.sent[2].content.body.startswith("There is nothing more to list")
+
+
+async def test_group_members_paginated(bot, plugin, respx_mock, monkeypatch):
+    def _page(request):
+        page_number = int(request.url.params["page"])
+        return httpx.Response(
+            200,
+            json={
+                "result": [{"username": f"member{page_number}"}],
+                "page": {
+                    "total_results": 2,
+                    "page_size": 1,
+                    "page_number": page_number,
+                    "total_pages": 2,
+                },
+            },
+        )
+
+    route = respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/members/").mock(
+        side_effect=_page
+    )
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value=dict()))
+    await bot.send("!group members dummygroup")
+    assert bot.sent[0].content.body == "Members of dummygroup: member1, member2"
+    assert route.call_count == 2
+
+
 async def test_group_members_mentions(bot, plugin, respx_mock, monkeypatch):
     respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/members/").mock(
         return_value=httpx.Response(
@@ -157,6 +350,34 @@ async def test_group_members_mentions(bot, plugin, respx_mock, monkeypatch):
     assert bot.sent[0].content.formatted_body == expected_formatted_body
 
 
+async def test_group_members_mentions_room_members(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/groups/dummygroup/members/").mock(
+        return_value=httpx.Response(
+            200,
+            json={
+                "result": [
+                    {
+                        "username": "member5",
+                        "ircnicks": ["matrix:/member5", "matrix:/member5bis"],
+                        "human_name": "Member 5",
+                    },
+                ]
+            },
+        ),
+    )
+    get_joined_members = mock.AsyncMock(return_value={})
+    monkeypatch.setattr(bot.client, "get_joined_members", get_joined_members)
+    await bot.send("!group members dummygroup")
+    assert bot.sent[0].content.body == (
+        "Members of dummygroup: member5 (@member5:fedora.im, @member5bis:fedora.im)"
+    )
+    # The members of the room are then followed from the membership events
+    await bot.dispatch(EventType.ROOM_MEMBER, make_member_event("@member5bis:fedora.im"))
+    await bot.send("!group members dummygroup")
+    assert bot.sent[1].content.body == "Members of dummygroup: Member 5"
+    get_joined_members.assert_called_once_with("testroom")
+
+
 @pytest.mark.parametrize("pronouns", [None, ["they / them", "mx"]])
 @pytest.mark.parametrize("alias", [None, "hi", "hello", "hello2", "hellomynameis"])
 async def test_user_hello(bot, plugin, respx_mock, monkeypatch, pronouns, alias):
@@ -223,7 +444,7 @@ async def test_user_is_none(bot, plugin, monkeypatch):
 
 @pytest.mark.parametrize("alias", [None, "hi", "hello", "hello2", "hellomynameis"])
 async def test_hello_with_username(bot, plugin, respx_mock, monkeypatch, alias):
-    respx_mock.get("http://fasjson.example.com/v1/users/dummy2/").mock(
+    route = respx_mock.get("http://fasjson.example.com/v1/users/dummy2/").mock(
         return_value=httpx.Response(
             200,
             json={
@@ -252,6 +473,36 @@ async def test_hello_with_username(bot, plugin, respx_mock, monkeypatch, alias):
     )
     assert bot.sent[0].content.body == expected
     assert bot.sent[0].content.formatted_body == expected_html
+    # Only the displayed fields are asked for
+    assert route.calls.last.request.headers["X-Fields"] == "human_name,pronouns,username"
+
+
+async def test_hello_displayname_cached(bot, plugin, respx_mock, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/users/dummy2/").mock(
+        return_value=httpx.Response(
+            200, json={"result": {"username": "dummy2", "human_name": "Dummy User 2"}}
+        )
+    )
+    get_displayname = mock.AsyncMock(return_value="Dummy User")
+    monkeypatch.setattr(bot.client, "get_displayname", get_displayname)
+    await bot.send("!hi dummy2")
+    await bot.send("!hi dummy2")
+    assert bot.sent[1].content.body == "Dummy User: Dummy User 2 (dummy2)"
+    get_displayname.assert_called_once_with("@dummy:example.com")
+    # The display name changed
+    await bot.dispatch(
+        EventType.ROOM_MEMBER, make_member_event("@dummy:example.com", displayname="Dummy")
+    )
+    await bot.send("!hi dummy2")
+    assert bot.sent[2].content.body == "Dummy: Dummy User 2 (dummy2)"
+    # The user left and came back without a display name
+    await bot.dispatch(
+        EventType.ROOM_MEMBER, make_member_event("@dummy:example.com", Membership.LEAVE)
+    )
+    await bot.dispatch(EventType.ROOM_MEMBER, make_member_event("@dummy:example.com"))
+    await bot.send("!hi dummy2")
+    assert bot.sent[3].content.body == "Dummy User: Dummy User 2 (dummy2)"
+    assert get_displayname.call_count == 2
 
 
 @pytest.mark.parametrize(
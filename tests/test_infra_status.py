@@ -1,6 +1,10 @@
+import time
+
 import httpx
 import pytest
 
+from fedora.clients.breaker import OPEN
+
 OUTAGE_FULL = {
     "title": "thetitle",
     "ticket": {"id": "1", "url": "https://i.test/1"},
@@ -136,3 +140,16 @@ async def test_infra_outages(bot, plugin, respx_mock, outages):
     assert len(bot.sent) == 1
     print(repr(bot.sent[0].content.body))
     assert bot.sent[0].content.body == outages[2]
+
+
+async def test_infra_outages_unavailable(bot, plugin, respx_mock):
+    route = respx_mock.get(url__startswith="http://status.example.com/")
+    breaker = plugin.upstreams["fedorastatus"].breaker
+    breaker.state = OPEN
+    breaker.opened_at = time.monotonic()
+    await bot.send("!infra status")
+    assert route.call_count == 0
+    assert len(bot.sent) == 1
+    assert bot.sent[0].content.body == (
+        "Sorry, fedorastatus is not responding at the moment, please try again later"
+    )
@@ -0,0 +1,40 @@
+import time
+from unittest import mock
+
+import pytest
+
+from fedora.matrixids import MatrixIdIndex
+
+
+@pytest.fixture
+def index(db):
+    return MatrixIdIndex(db, refresh_interval=3600)
+
+
+async def test_get_set(index):
+    assert await index.get("@dummy:example.com") is None
+    await index.set("@dummy:example.com", "dummy")
+    assert await index.get("@dummy:example.com") == ("dummy", False)
+    # Updated in place
+    await index.set("@dummy:example.com", "dummy2")
+    assert await index.get("@dummy:example.com") == ("dummy2", False)
+
+
+async def test_stale(index, monkeypatch):
+    await index.set("@dummy:example.com", "dummy")
+    now = mock.Mock(return_value=time.time() + 3600)
+    monkeypatch.setattr("fedora.matrixids.time.time", now)
+    assert await index.get("@dummy:example.com") == ("dummy", True)
+
+
+async def test_remove(index):
+    await index.set("@dummy:example.com", "dummy")
+    await index.remove("@dummy:example.com")
+    assert await index.get("@dummy:example.com") is None
+    # Removing an unknown Matrix ID is fine
+    await index.remove("@dummy:example.com")
+
+
+async def test_plugin_index(plugin):
+    assert plugin.fasjsonclient.matrix_ids is plugin.matrix_ids
+    assert plugin.matrix_ids.refresh_interval == 86400
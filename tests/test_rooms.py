@@ -0,0 +1,73 @@
+import asyncio
+from unittest import mock
+
+from mautrix.types import EventType, Membership, RoomNameStateEventContent, StateEvent
+
+from fedora.rooms import RoomMembers
+
+from .bot import make_member_event
+
+
+async def test_get():
+    client = mock.Mock()
+    client.get_joined_members = mock.AsyncMock(return_value={"@dummy:example.com": {}})
+    members = RoomMembers()
+    results = await asyncio.gather(members.get(client, "room"), members.get(client, "room"))
+    assert results == [{"@dummy:example.com"}, {"@dummy:example.com"}]
+    assert await members.get(client, "room") == {"@dummy:example.com"}
+    client.get_joined_members.assert_called_once_with("room")
+
+
+async def test_update():
+    client = mock.Mock()
+    client.get_joined_members = mock.AsyncMock(return_value={"@dummy:example.com": {}})
+    members = RoomMembers()
+    # Ignored until the room is loaded
+    members.update("room", "@other:example.com", Membership.JOIN)
+    assert await members.get(client, "room") == {"@dummy:example.com"}
+    members.update("room", "@other:example.com", Membership.JOIN)
+    members.update("room", "@dummy:example.com", Membership.LEAVE)
+    assert await members.get(client, "room") == {"@other:example.com"}
+    members.update("room", "@other:example.com", Membership.BAN)
+    assert await members.get(client, "room") == set()
+    assert members.version("room") == 3
+    # Already left
+    members.update("room", "@other:example.com", Membership.LEAVE)
+    assert members.version("room") == 3
+    members.forget("room")
+    assert "room" not in members.rooms
+    assert members.version("room") == 4
+
+
+async def test_handler(bot, plugin, monkeypatch):
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value={}))
+    await plugin.room_members.get(bot.client, "testroom")
+    await bot.dispatch(EventType.ROOM_MEMBER, make_member_event("@dummy:example.com"))
+    assert plugin.room_members.rooms["testroom"] == {"@dummy:example.com"}
+    await bot.dispatch(
+        EventType.ROOM_MEMBER, make_member_event("@dummy:example.com", Membership.LEAVE)
+    )
+    assert plugin.room_members.rooms["testroom"] == set()
+
+
+async def test_handler_bot_leaves(bot, plugin, monkeypatch):
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value={}))
+    await plugin.room_members.get(bot.client, "testroom")
+    await bot.dispatch(EventType.ROOM_MEMBER, make_member_event(bot.client.mxid, Membership.LEAVE))
+    assert "testroom" not in plugin.room_members.rooms
+
+
+async def test_handler_other_content(bot, plugin, monkeypatch):
+    monkeypatch.setattr(bot.client, "get_joined_members", mock.AsyncMock(return_value={}))
+    await plugin.room_members.get(bot.client, "testroom")
+    event = StateEvent(
+        type=EventType.ROOM_MEMBER,
+        room_id="testroom",
+        event_id="test",
+        sender="@dummy:example.com",
+        timestamp=0,
+        state_key="@dummy:example.com",
+        content=RoomNameStateEventContent(name="biscuits"),
+    )
+    await bot.dispatch(EventType.ROOM_MEMBER, event)
+    assert plugin.room_members.rooms["testroom"] == set()
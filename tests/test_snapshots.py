@@ -0,0 +1,103 @@
+import asyncio
+import logging
+
+import pytest
+
+from fedora.clients.cache import TTLCache
+from fedora.clients.fasjson import CachedUser
+from fedora.snapshots import CacheSnapshots
+
+
+@pytest.fixture
+def snapshots(db):
+    return CacheSnapshots(db, interval=300)
+
+
+async def test_save_load(snapshots, db):
+    cache = TTLCache()
+    cache.set("dummy", 1)
+    snapshots.add("dummies", cache.dump, cache.load)
+    await snapshots.save()
+    # Saved again in place
+    cache.set("dummy2", 2)
+    await snapshots.save()
+
+    restored = TTLCache()
+    other = CacheSnapshots(db, interval=300)
+    other.add("dummies", restored.dump, restored.load)
+    await other.load()
+    assert restored.get("dummy") == 1
+    assert restored.get("dummy2") == 2
+
+
+async def test_load_unknown_cache(snapshots, db):
+    cache = TTLCache()
+    cache.set("dummy", 1)
+    snapshots.add("dummies", cache.dump, cache.load)
+    await snapshots.save()
+    # The cache was removed since
+    await CacheSnapshots(db, interval=300).load()
+
+
+async def test_load_invalid(snapshots, db, caplog):
+    await db.execute("INSERT INTO cache_snapshots (name, data) VALUES ('dummies', 'biscuits')")
+    cache = TTLCache()
+    snapshots.add("dummies", cache.dump, cache.load)
+    with caplog.at_level(logging.WARNING):
+        await snapshots.load()
+    assert len(cache) == 0
+    assert "Could not load the snapshot of the dummies cache" in caplog.text
+
+
+async def test_save_error(snapshots, caplog):
+    cache = TTLCache()
+    cache.set("dummy", object())
+    snapshots.add("dummies", cache.dump, cache.load)
+    await snapshots.save()
+    assert "Could not save the snapshot of the dummies cache" in caplog.text
+
+
+async def test_disabled(db):
+    snapshots = CacheSnapshots(db, interval=0)
+    cache = TTLCache()
+    cache.set("dummy", 1)
+    snapshots.add("dummies", cache.dump, cache.load)
+    snapshots.start()
+    await snapshots.stop()
+    await snapshots.load()
+    assert await db.fetch("SELECT * FROM cache_snapshots") == []
+
+
+async def test_periodic(db):
+    snapshots = CacheSnapshots(db, interval=0.01)
+    cache = TTLCache()
+    cache.set("dummy", 1)
+    snapshots.add("dummies", cache.dump, cache.load)
+    snapshots.start()
+    await asyncio.sleep(0.05)
+    assert len(await db.fetch("SELECT * FROM cache_snapshots")) == 1
+    await snapshots.stop()
+
+
+async def test_saved_on_stop(snapshots, db):
+    cache = TTLCache()
+    snapshots.add("dummies", cache.dump, cache.load)
+    snapshots.start()
+    cache.set("dummy", 1)
+    await snapshots.stop()
+    restored = TTLCache()
+    other = CacheSnapshots(db, interval=300)
+    other.add("dummies", restored.dump, restored.load)
+    await other.load()
+    assert restored.get("dummy") == 1
+
+
+async def test_plugin_warm_start(plugin):
+    plugin.user_cache.set("dummy", CachedUser(frozenset(["username"]), {"username": "dummy"}))
+    plugin.missing_cache.set(("user", "nosuchuser"), True)
+    await plugin.stop()
+    await plugin.start()
+    assert plugin.user_cache.get("dummy") == CachedUser(
+        frozenset(["username"]), {"username": "dummy"}
+    )
+    assert ("user", "nosuchuser") in plugin.missing_cache
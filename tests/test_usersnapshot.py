@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from unittest import mock
+
+import pytest
+
+from fedora.clients.fasjson import FasjsonClient
+from fedora.clients.upstream import Upstream
+from fedora.usersnapshot import UserSnapshot
+
+from .fasjson import FakeFasjson
+
+
+def make_user(username, **kwargs):
+    return {
+        "username": username,
+        "human_name": username.title(),
+        "pronouns": None,
+        "timezone": "UTC",
+        "locale": "en-US",
+        "ircnicks": [f"matrix://example.com/{username}"],
+        "creation": "2020-01-01T00:00:00",
+        "emails": [f"{username}@example.com"],
+        "gpgkeyids": ["ABCDEF"],
+        **kwargs,
+    }
+
+
+@pytest.fixture
+def fasjson(respx_mock):
+    return FakeFasjson(respx_mock, [make_user(f"user{n}") for n in range(5)])
+
+
+@pytest.fixture
+def snapshot(db):
+    return UserSnapshot(db, interval=3600, page_size=2)
+
+
+@pytest.fixture
+def client(snapshot):
+    # No response cache, to count the requests
+    return FasjsonClient(
+        "http://fasjson.example.com", upstream=Upstream("fasjson"), snapshot=snapshot
+    )
+
+
+async def test_sync(fasjson, snapshot, client):
+    await snapshot.sync(client)
+    assert fasjson.list_route.call_count == 3
+    user = await snapshot.get("user1")
+    # Only the projection is kept
+    assert user == {
+        "username": "user1",
+        "human_name": "User1",
+        "pronouns": None,
+        "timezone": "UTC",
+        "locale": "en-US",
+        "ircnicks": ["matrix://example.com/user1"],
+        "creation": "2020-01-01T00:00:00",
+    }
+    assert await snapshot.get("nosuchuser") is None
+    assert await snapshot.get_by_matrix_id("@user2:example.com") == [await snapshot.get("user2")]
+    assert await snapshot.get_by_matrix_id("@nobody:example.com") == []
+
+
+async def test_sync_changes(fasjson, snapshot, client, caplog):
+    await snapshot.sync(client)
+    fasjson.users["user1"]["human_name"] = "Renamed"
+    fasjson.users["user2"]["ircnicks"] = ["matrix://example.com/other"]
+    del fasjson.users["user3"]
+    fasjson.users["user9"] = make_user("user9")
+    # Fields that are not kept don't matter
+    fasjson.users["user4"]["emails"] = []
+    with caplog.at_level(logging.INFO):
+        await snapshot.sync(client)
+    assert "Synced the Fedora Accounts users: 3 changed, 1 removed" in caplog.text
+    assert (await snapshot.get("user1"))["human_name"] == "Renamed"
+    assert await snapshot.get_by_matrix_id("@user2:example.com") == []
+    assert [user["username"] for user in await snapshot.get_by_matrix_id("@other:example.com")] == [
+        "user2"
+    ]
+    assert await snapshot.get("user3") is None
+    assert await snapshot.get_by_matrix_id("@user3:example.com") == []
+    assert (await snapshot.get("user9"))["username"] == "user9"
+
+
+async def test_not_usable(fasjson, db, client):
+    snapshot = UserSnapshot(db, interval=0)
+    await snapshot.sync(client)
+    # Disabled
+    assert await snapshot.get("user1") is None
+    assert await snapshot.get_by_matrix_id("@user1:example.com") == []
+    # Too old
+    snapshot = UserSnapshot(db, interval=3600, max_age=60)
+    await snapshot.sync(client)
+    assert await snapshot.get("user1") is not None
+    snapshot.synced = time.time() - 60
+    assert await snapshot.get("user1") is None
+
+
+async def test_client_get_user(fasjson, snapshot, client):
+    await snapshot.sync(client)
+    user = await client.get_user("user1", fields=["timezone"])
+    assert user == {"username": "user1", "timezone": "UTC"}
+    assert fasjson.user_route.call_count == 0
+    # Not in the snapshot yet
+    fasjson.users["newuser"] = make_user("newuser")
+    assert (await client.get_user("newuser", fields=["timezone"]))["timezone"] == "UTC"
+    assert fasjson.user_route.call_count == 1
+    # Fields that are not in the snapshot
+    user = await client.get_user("user1", fields=["gpgkeyids"])
+    assert user == {"username": "user1", "gpgkeyids": ["ABCDEF"]}
+    assert fasjson.user_route.call_count == 2
+
+
+async def test_client_get_users_by_matrix_id(fasjson, snapshot, client):
+    await snapshot.sync(client)
+    user = await client.get_users_by_matrix_id("@user1:example.com", fields=["human_name"])
+    assert user == {"username": "user1", "human_name": "User1"}
+    assert fasjson.search_route.call_count == 0
+    # Not in the snapshot yet
+    fasjson.users["newuser"] = make_user("newuser")
+    user = await client.get_users_by_matrix_id("@newuser:example.com", fields=["human_name"])
+    assert user == {"username": "newuser", "human_name": "Newuser"}
+    assert fasjson.search_route.call_count == 1
+
+
+async def test_start_stop(fasjson, db, client):
+    snapshot = UserSnapshot(db, interval=3600)
+    await snapshot.start(client)
+    await asyncio.sleep(0.1)
+    # Never synced before, synced right away
+    assert fasjson.list_route.call_count == 1
+    await snapshot.stop()
+    # Recently synced, not synced again after a restart
+    restarted = UserSnapshot(db, interval=3600)
+    await restarted.start(client)
+    await asyncio.sleep(0.1)
+    assert restarted.synced == int(snapshot.synced)
+    assert fasjson.list_route.call_count == 1
+    assert await restarted.get("user1") is not None
+    await restarted.stop()
+
+
+async def test_disabled(db, client):
+    snapshot = UserSnapshot(db, interval=0)
+    await snapshot.start(client)
+    assert snapshot._task is None
+    await snapshot.stop()
+
+
+async def test_sync_error(respx_mock, db, client, caplog, monkeypatch):
+    respx_mock.get("http://fasjson.example.com/v1/users/").respond(500)
+    snapshot = UserSnapshot(db, interval=3600)
+    sleep = mock.AsyncMock(side_effect=[None, asyncio.CancelledError()])
+    monkeypatch.setattr("fedora.usersnapshot.asyncio.sleep", sleep)
+    with pytest.raises(asyncio.CancelledError):
+        await snapshot._run(client)
+    assert "Could not sync the Fedora Accounts users" in caplog.text
+    sleep.assert_called_with(3600)
+
+
+async def test_plugin_hello(bot, plugin, respx_mock, monkeypatch):
+    fasjson = FakeFasjson(respx_mock, [make_user("dummy2")])
+    plugin.user_snapshot.interval = 3600
+    await plugin.user_snapshot.sync(plugin.fasjsonclient)
+    monkeypatch.setattr(bot.client, "get_displayname", mock.AsyncMock(return_value="Dummy"))
+    await bot.send("!hi dummy2")
+    assert bot.sent[0].content.body == "Dummy: Dummy2 (dummy2)"
+    assert fasjson.user_route.call_count == 0
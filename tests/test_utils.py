@@ -1,8 +1,12 @@
+from unittest import mock
+
 import httpx
 import pytest
+from maubot.matrix import MaubotMessageEvent
 from mautrix.util.async_db import Scheme
 
 import fedora
+from fedora.clients.cache import TTLCache
 
 from .bot import make_message
 
@@ -124,3 +128,15 @@ def test_get_rowcount_postgres():
             self.scheme = Scheme.POSTGRES
 
     assert fedora.utils.get_rowcount(mock_db(), "row1 row2 row3 3") == 3
+
+
+@pytest.mark.parametrize("displayname", [None, "Dummy User"])
+async def test_inline_reply_not_cached(bot, displayname, monkeypatch):
+    monkeypatch.setattr(bot.client, "get_displayname", mock.AsyncMock(return_value=displayname))
+    evt = MaubotMessageEvent(make_message("!hi"), bot.client)
+    displaynames = TTLCache()
+    await fedora.utils.inline_reply(evt, "hello", displaynames)
+    await fedora.utils.inline_reply(evt, "hello")
+    # Users without a display name are asked for every time
+    assert len(displaynames) == (1 if displayname else 0)
+    assert bot.sent[1].content.body == f"{displayname or '@dummy:example.com'}: hello"